@@ -11,8 +11,10 @@
 #
 
 import os
+import sys
+import json
 import numpy
-import trimesh
+from collections import OrderedDict
 
 VERSION_QT5 = False
 try:
@@ -21,7 +23,7 @@ except ImportError:
     from PyQt5.QtCore import pyqtSlot, QObject
     VERSION_QT5 = True
 
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, TYPE_CHECKING
 
 from cura.CuraApplication import CuraApplication
 
@@ -31,6 +33,7 @@ from UM.Logger import Logger
 from UM.Version import Version
 
 from UM.Scene.Selection import Selection
+from UM.Scene.Iterator.DepthFirstIterator import DepthFirstIterator
 from UM.Scene.SceneNode import SceneNode
 from UM.Operations.GroupedOperation import GroupedOperation
 from UM.Resources import Resources
@@ -46,7 +49,12 @@ from UM.Math.Matrix import Matrix
 
 from UM.i18n import i18nCatalog
 
-from .CalculateOrientationJob import CalculateOrientationJob
+# The orientation job, the MeshTweaker and the hull alignment are imported on the first use of a menu item, so they don't
+# slow down the start of Cura. Check the startup imports with: python TweakerBenchmark.py --startup
+if TYPE_CHECKING:
+    from .OrientationCache import OrientationCache
+    from .OrientationService import OrientationClient
+    from .ParameterProfiles import ParameterProfile
 # Origine Source Code from [FieldOfView ](https://github.com/fieldOfView) 
 from .SetTransformMatrixOperation import SetTransformMatrixOperation
 
@@ -56,6 +64,9 @@ Resources.addSearchPath(
 
 catalog = i18nCatalog("autorotationtool")
 
+# Amount of nodes whose preprocessed mesh is kept for checkPrintability
+ANALYZER_COUNT = 4
+
 if catalog.hasTranslationLoaded():
     Logger.log("i", "Auto Rotation Tool Plugin translation loaded!")
     
@@ -72,14 +83,32 @@ class AutoRotationTool(Extension, QObject,):
         
         self._extended_mode = False
 
+        # Amount of worker processes to orient several models in parallel, 1 orients them one after another in Cura
+        self._preferences = self._application.getPreferences()
+        self._preferences.addPreference("AutoRotationTool/processes", 1)
+        # Size of the orientation result cache in MB, 0 disables the cache
+        self._preferences.addPreference("AutoRotationTool/cache_size", 64)
+        self._cache = None  # type: Optional[OrientationCache]
+        # Name of the parameter profile of all materials, and a JSON object with the profile of single material types,
+        # e.g. {"PETG": "petg", "TPU": "tpu"}. A profile named like the material type is used without an entry.
+        self._preferences.addPreference("AutoRotationTool/profile", "default")
+        self._preferences.addPreference("AutoRotationTool/material_profiles", "{}")
+        self._profiles = None  # type: Optional[Dict[str, ParameterProfile]]
+        # Orient the models in a long-lived worker process instead of Cura's process, so the interface stays smooth
+        self._preferences.addPreference("AutoRotationTool/worker_process", False)
+        self._worker = None  # type: Optional[OrientationClient]
+        self._application.applicationShuttingDown.connect(self._stopWorker)
+        # Preprocessed meshes of the last checked nodes, so checking them again after a small rotation is fast
+        self._analyzers = OrderedDict()  # type: OrderedDict
+
         self.setMenuName(catalog.i18nc("@item:inmenu", "Rotation Tools")) # Main Menu
         self.addMenuItem(catalog.i18nc("@item:inmenu", "Calculate fast optimal printing orientation"), self.doFastAutoOrientation)
         self.addMenuItem(catalog.i18nc("@item:inmenu", "Calculate extended optimal printing orientation"), self.doExtendedAutoOrientation)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Calculate optimal orientation for the build plate"), self.doPlateOrientation)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Check printability of the current orientation"), self.checkPrintability)
         self.addMenuItem("", lambda: None)
         self.addMenuItem(catalog.i18nc("@item:inmenu", "Rotate side direction (X)"), self.rotateSideDirection)
-        # Issue with trimesh.bounds.oriented_bounds_2D in release 4.X for Trimesh
-        if not VERSION_QT5:        
-            self.addMenuItem(catalog.i18nc("@item:inmenu", "Rotate main direction (X)"), self.rotateMainDirection)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Rotate main direction (X)"), self.rotateMainDirection)
         self.addMenuItem(" ", lambda: None)
         self.addMenuItem(catalog.i18nc("@item:inmenu", "Reset Rotation"), self.resetRotation)
 
@@ -166,158 +195,56 @@ class AutoRotationTool(Extension, QObject,):
         
     @pyqtSlot()
     def rotateMainDirection(self) -> None:
-        nodes_list = self._getSelectedNodes()
-        if not nodes_list:
-            return
-
-        op = GroupedOperation()
-        for node in nodes_list:
-            mesh_data = node.getMeshData()
-            if not mesh_data:
-                continue
-            
-            hull_polygon = node.callDecoration("_compute2DConvexHull")
-            # test but not sure in witch case we have this situation ?
-            if not hull_polygon or hull_polygon.getPoints is None:
-                Logger.log("w", "Object {} cannot be calculated because it has no convex hull.".format(node.getName()))
-                continue
-
-            points=hull_polygon.getPoints()
-            # Get the Rotation Matrix     
-            # Logger.log('d', "Points : \n{}".format(points))                  
-            transform, rectangle = trimesh.bounds.oriented_bounds_2D(points)
-            Logger.log('d', "Rotation : \n{}".format(transform)) 
-
-            # Change Transfo data
-            # Don't ask me Why just test and try not sure of the validity of oriented_bounds_2D by trimesh 
-            t = Matrix()
-            Vect = [transform[1][1],0,transform[0][1]]
-            t.setColumn(0,Vect)
-            Vect = [transform[1][0],0,transform[0][0]]
-            t.setColumn(2,Vect)
-
-            #local_transformation.setColumn(1,transform[1])
-            local_transformation = Matrix()
-            local_transformation.multiply(t)
-            local_transformation.multiply(node.getLocalTransformation())  
-
-            # Log for debugging and Analyse           
-            Logger.log('d', "Local_transformation     :\n{}".format(node.getLocalTransformation())) 
-            Logger.log('d', "TransformMatrixOperation :\n{}".format(local_transformation))   
-            # By using this code rotate the Element but no Undo is possible via the Reinit rotation function
-            # node.setTransformation(local_transformation)            
-            op.addOperation(SetTransformMatrixOperation(node, local_transformation))
-
-        op.push()
+        # The long side of the minimum area rectangle of the hull, parallel to the X axis
+        self._alignNodes("main")
 
     @pyqtSlot()
     def rotateSideDirection(self) -> None:
+        # The longest edge of the hull, parallel to the X axis
+        self._alignNodes("side")
+
+    def _alignNodes(self, alignment: str) -> None:
         nodes_list = self._getSelectedNodes()
         if not nodes_list:
             return
 
-        op = GroupedOperation()
+        nodes = []
+        hulls = []
         for node in nodes_list:
             mesh_data = node.getMeshData()
             if not mesh_data:
                 continue
-            
+
             hull_polygon = node.callDecoration("_compute2DConvexHull")
             # test but not sure in witch case we have this situation ?
             if not hull_polygon or hull_polygon.getPoints is None:
                 Logger.log("w", "Object {} cannot be calculated because it has no convex hull.".format(node.getName()))
                 continue
- 
-            points=hull_polygon.getPoints()
-
-            # Init
-            np = 0
-            l_v = 0
-            for point in points:
-                # Logger.log('d', "p{} X : {} Y : {}".format(np,point[0],point[1]))
-                if np>0 :                         
-                    new_position = Vector(point[0], point[1], 0)
-                    lg=new_position-first_pt
-                    lght = lg.length()
-                    if lght>l_v :
-                        l_v = lght
-                        s_lg=lg
-
-                    first_pt=new_position
-                else :
-                    first_pt = Vector(point[0], point[1], 0)             
-                np+=1
-            
-            # Last vector  to close the loop       
-            lg=Vector(points[0][0], points[0][1], 0)-first_pt
-            lght = lg.length()
-            if lght>l_v :
-                s_lg=lg
-                # Logger.log('d', "s_lg on las point : {}".format(s_lg))
-            
-            vectX = (1, 0, 0)
-            vectY = (0, 1, 0)
-            anGl= self._angle_between(vectX,(s_lg.x, s_lg.y, 0))
-            deganGl = anGl/numpy.pi*180
-            
-            # For debuging output the vector director and the Angle ( in radians and degree)
-            Logger.log('d', "s_lg   : {}".format(s_lg))
-            Logger.log('d', "Angle : {} Angle° : {}".format(anGl,deganGl)) 
-            #Something done in the AutoRotationTool.py ... It's not very clear for me, but I still have to investigate this point
-            dv=self._dot_vector(vectY,(s_lg.x, s_lg.y, 0))
-            Logger.log('d', "Dot vector : {}".format(dv))  
-            if dv > 0 :
-                direction = 1
-            else :
-                direction = -1
-                
-            extents = mesh_data.getExtents()
-            center = Vector(extents.center.x, extents.center.y, extents.center.z)
+            nodes.append(node)
+            hulls.append(hull_polygon.getPoints())
+        if not nodes:
+            return
+
+        # The hulls of all nodes are aligned at once
+        from .HullAlignment import hull_alignments
+        angles = hull_alignments(hulls)[alignment]
 
-            # Get the Rotation Matrix
+        op = GroupedOperation()
+        for node, angle in zip(nodes, angles):
+            # The hull points are the X and Z coordinates, so the rotation is around the vertical Y axis
             rotation = Matrix()
-            # setByRotationAxis or rotateByAxis ?  don't think there is a difference
-            rotation.setByRotationAxis(direction*anGl, Vector(0, 1, 0))
-            Logger.log('d', "Rotation                 :\n{}".format(rotation))
-            
+            rotation.setByRotationAxis(float(angle), Vector(0, 1, 0))
+            Logger.log('d', "Angle of {} : {}°".format(node.getName(), numpy.degrees(angle)))
+
             # Change Transfo data
-            local_transformation = Matrix()      
+            local_transformation = Matrix()
             local_transformation.multiply(rotation)
-            local_transformation.multiply(node.getLocalTransformation()) 
-            # Log for debugging and Analyse           
-            Logger.log('d', "Local_transformation     :\n{}".format(node.getLocalTransformation())) 
-            Logger.log('d', "TransformMatrixOperation :\n{}".format(local_transformation))   
+            local_transformation.multiply(node.getLocalTransformation())
             # By using this code rotate the Element but no Undo is possible via the Reinit rotation function
-            # node.setTransformation(local_transformation)            
+            # node.setTransformation(local_transformation)
             op.addOperation(SetTransformMatrixOperation(node, local_transformation))
 
         op.push()
-    
-    def _unit_vector(self, vector):
-        """ Returns the unit vector of the vector.  """
-        return vector / numpy.linalg.norm(vector)
-
-    def _angle_between(self, v1, v2):
-        """ Returns the angle in radians between vectors 'v1' and 'v2'::
-        """
-
-        v1_u = self._unit_vector(v1)
-        v2_u = self._unit_vector(v2)
-        
-        angle = numpy.arccos(numpy.clip(numpy.dot(v1_u, v2_u), -1.0, 1.0))
-     
-        return angle
- 
-    def _dot_vector(self, v1, v2):
-        """ Returns the scalar product between vectors 'v1' and 'v2'::
-        """
-
-        v1_u = self._unit_vector(v1)
-        v2_u = self._unit_vector(v2)
-        
-        dotv = numpy.dot(v1_u, v2_u)
-     
-        return dotv
 
     @pyqtSlot()
     def doFastAutoOrientation(self):
@@ -327,32 +254,195 @@ class AutoRotationTool(Extension, QObject,):
     def doExtendedAutoOrientation(self):
         self._extended_mode=True    
         self.doAutoOrientation(True)
+    @pyqtSlot()
+    def doPlateOrientation(self):
+        # The selected models, or all models of the active build plate, are oriented together in the fast mode
+        self._extended_mode=False
+        nodes = Selection.getAllSelectedObjects()[:]
+        if not nodes:
+            active_build_plate = self._application.getMultiBuildPlateModel().activeBuildPlate
+            for node in DepthFirstIterator(self._application.getController().getScene().getRoot()):
+                if node.callDecoration("isSliceable") and node.callDecoration("getBuildPlateNumber") == active_build_plate:
+                    nodes.append(node)
+        global_stack = self._application.getGlobalContainerStack()
+        if global_stack is None:
+            return
+        plate_area = float(global_stack.getProperty("machine_width", "value")) * float(global_stack.getProperty("machine_depth", "value"))
+        self.doAutoOrientation(False, nodes, plate_area)
 
-    def doAutoOrientation(self, extended_mode):
+    def doAutoOrientation(self, extended_mode, nodes = None, plate_area = None):
         # If we still had a message open from last time, hide it.
         if self._message:
             self._message.hide()
 
-        selected_nodes = Selection.getAllSelectedObjects()
+        selected_nodes = Selection.getAllSelectedObjects() if nodes is None else nodes
         if len(selected_nodes) == 0:
             self._message = Message(catalog.i18nc("@info:status", "No objects selected to orient. Please select one or more objects and try again."), title = catalog.i18nc("@title", "Auto Rotate Tool"))
             self._message.show()
             return
 
-        message = Message(catalog.i18nc("@info:status", "Calculating the optimal orientation..."), 0, False, -1, title = catalog.i18nc("@title", "Auto Rotate Tool"))
-        message.show()
+        message = Message(catalog.i18nc("@info:status", "Calculating the optimal orientation..."), 0, False, 0, title = catalog.i18nc("@title", "Auto Rotate Tool"))
+        message.addAction("cancel", catalog.i18nc("@action:button", "Cancel"), "", catalog.i18nc("@info:tooltip", "Stop the calculation, the models oriented so far keep their new orientation"))
 
-        job = CalculateOrientationJob(selected_nodes, extended_mode = extended_mode, message = message)
+        from .CalculateOrientationJob import CalculateOrientationJob
+        processes = int(self._preferences.getValue("AutoRotationTool/processes"))
+        profiles = [self._getProfile(node) for node in selected_nodes]
+        job = CalculateOrientationJob(selected_nodes, extended_mode = extended_mode, message = message, processes = processes, cache = self._getCache(), plate_area = plate_area, profiles = profiles, worker = self._getWorker())
+        message.actionTriggered.connect(lambda message, action: job.cancel() if action == "cancel" else None)
+        message.show()
         job.finished.connect(self._onFinished)
         job.start()
 
+    @pyqtSlot()
+    def checkPrintability(self) -> None:
+        nodes_list = self._getAllSelectedNodes()
+        if not nodes_list:
+            return
+
+        min_volume = bool(self._application.getPreferences().getValue("OrientationPlugin/min_volume"))
+        requests = []
+        for node in nodes_list:
+            key, mesh_data, mode, profile = self._getAnalyzerKey(node, min_volume)
+            if self._getAnalyzer(node, min_volume) is None:
+                parameter = profile.parameter(min_volume) if profile is not None else None
+                requests.append((key, mesh_data, mode, node.getWorldTransformation().getData(), {"extended_mode": self._extended_mode, "min_volume": min_volume, "parameter": parameter}))
+        if not requests:
+            self._showPrintability(nodes_list, min_volume)
+            return
+
+        # The meshes are preprocessed in a job, the message is shown when it is finished
+        self._message.hide()
+        self._message = Message(catalog.i18nc("@info:status", "Preparing the printability check..."), 0, False, -1, title = catalog.i18nc("@title", "Auto Rotate Tool"))
+        self._message.show()
+        from .CheckPrintabilityJob import CheckPrintabilityJob
+        job = CheckPrintabilityJob(nodes_list, min_volume, requests)
+        job.finished.connect(self._onAnalyzersFinished)
+        job.start()
+
+    def _onAnalyzersFinished(self, job) -> None:
+        for key, entry in job.getEntries():
+            self._analyzers[key] = entry
+            self._analyzers.move_to_end(key)
+        while len(self._analyzers) > ANALYZER_COUNT:
+            self._analyzers.popitem(last = False)
+        self._showPrintability(job.getNodes(), job.getMinVolume())
+
+    def _showPrintability(self, nodes_list: List[SceneNode], min_volume: bool) -> None:
+        lines = []
+        for node in nodes_list:
+            cached = self._getAnalyzer(node, min_volume)
+            if cached is None:
+                continue  # the mesh was changed or could not be preprocessed
+            analyzer, build_transformation = cached
+            # The upward direction of the world (y) expressed in the coordinates the analyzer was built with
+            rotation = node.getWorldTransformation().getData()[:3, :3].dot(numpy.linalg.inv(build_transformation[:3, :3]))
+            alignment = rotation.T.dot([0, 1, 0])
+            results = analyzer.score_neighbourhood(alignment, numpy.radians(5), 8)
+            best = min(results[1:], key = lambda result: result[4])
+            lines.append(catalog.i18nc("@info:status", "{name}: unprintability {unprintability:.3g}, bottom {bottom:.0f} mm², overhang {overhang:.0f}, best within 5°: {best:.3g}").format(
+                name = node.getName(), unprintability = results[0][4], bottom = results[0][1], overhang = results[0][2], best = best[4]))
+
+        self._message.hide()
+        if not lines:
+            return
+        self._message = Message("\n".join(lines), title = catalog.i18nc("@title", "Auto Rotate Tool"))
+        self._message.show()
+
+    def _getAnalyzerKey(self, node: SceneNode, min_volume: bool):
+        """Returns the cache key, the mesh data, the mode and the parameter profile of the analyzer of a node."""
+        profile = self._getProfile(node)
+        mode = (self._extended_mode, bool(min_volume), profile.key() if profile is not None else None)
+        return id(node), node.getMeshData(), mode, profile
+
+    def _getAnalyzer(self, node: SceneNode, min_volume: bool):
+        """Returns the cached analyzer of a node and the transformation it was built with, None if it has to be built."""
+        key, mesh_data, mode, _ = self._getAnalyzerKey(node, min_volume)
+        entry = self._analyzers.get(key)
+        if entry is None or entry[0] is not mesh_data or entry[1] != mode:
+            return None
+        self._analyzers.move_to_end(key)
+        return entry[2], entry[3]
+
+    def _getProfiles(self) -> Dict[str, "ParameterProfile"]:
+        # The profiles of the plugin folder and of the data folder of Cura are loaded once
+        if self._profiles is None:
+            from .ParameterProfiles import load_profiles
+            folders = [os.path.join(os.path.abspath(os.path.dirname(__file__)), "profiles"),
+                       os.path.join(Resources.getDataStoragePath(), "autorotationtool", "profiles")]
+            errors = []  # type: List[str]
+            self._profiles = load_profiles(folders, errors)
+            for error in errors:
+                Logger.log("w", "Parameter profile skipped: {}".format(error))
+            Logger.log("d", "Parameter profiles: {}".format(", ".join(profile.key() for profile in self._profiles.values())))
+        return self._profiles
+
+    def _getProfile(self, node: SceneNode) -> Optional["ParameterProfile"]:
+        """Returns the parameter profile of the material of a node, None for the default parameters."""
+        profiles = self._getProfiles()
+        material = ""
+        global_stack = self._application.getGlobalContainerStack()
+        if global_stack is not None and global_stack.extruderList:
+            extruders = global_stack.extruderList
+            try:
+                extruder = extruders[int(node.callDecoration("getActiveExtruderPosition"))]
+            except (TypeError, ValueError, IndexError):
+                extruder = extruders[0]
+            material = str(extruder.material.getMetaDataEntry("material", "")).lower()
+
+        try:
+            material_profiles = {str(key).lower(): str(value).lower() for key, value in json.loads(self._preferences.getValue("AutoRotationTool/material_profiles") or "{}").items()}
+        except (ValueError, AttributeError):
+            Logger.log("w", "AutoRotationTool/material_profiles is not a JSON object")
+            material_profiles = {}
+        name = material_profiles.get(material) or (material if material in profiles else str(self._preferences.getValue("AutoRotationTool/profile")).lower())
+        if name not in profiles:
+            Logger.log("w", "Unknown parameter profile {}, the default parameters are used".format(name))
+            return None
+        return None if name == "default" else profiles[name]
+
+    def _getCache(self) -> Optional["OrientationCache"]:
+        cache_size = float(self._preferences.getValue("AutoRotationTool/cache_size"))
+        if cache_size <= 0:
+            return None
+        if self._cache is None:
+            from .OrientationCache import OrientationCache
+            try:
+                self._cache = OrientationCache(os.path.join(Resources.getCacheStoragePath(), "autorotationtool"), version = self.getVersion())
+            except OSError:
+                Logger.logException("w", "Could not create the orientation cache")
+                return None
+        self._cache.setMaxSize(int(cache_size * 1024 * 1024))
+        return self._cache
+
+    def _getWorker(self) -> Optional["OrientationClient"]:
+        if not bool(self._preferences.getValue("AutoRotationTool/worker_process")):
+            self._stopWorker()
+            return None
+        if self._worker is None:
+            # The worker process unpickles its main loop by the top level module name, so the plugin folder has to be on the path.
+            plugin_path = os.path.dirname(os.path.abspath(__file__))
+            if plugin_path not in sys.path:
+                sys.path.append(plugin_path)
+            import OrientationService
+            self._worker = OrientationService.OrientationClient()  # the process is started by the first job
+        return self._worker
+
+    def _stopWorker(self) -> None:
+        if self._worker is not None:
+            self._worker.stop()
+            self._worker = None
+
     def _onFinished(self, job):
         if self._message:
             self._message.hide()
 
         if job.getMessage() is not None:
             job.getMessage().hide()
-            if self._extended_mode :
+            if job.isCancelled():
+                _text = catalog.i18nc("@info:status", "Orientation cancelled, {done} of {total} objects have been oriented.").format(done = job.getOrientedCount(), total = len(job.getNodes()))
+            elif job.getPlateArea() is not None:
+                _text = catalog.i18nc("@info:status", "All objects have been oriented to fit onto the build plate.")
+            elif self._extended_mode :
                 _text = catalog.i18nc("@info:status", "All selected objects have been oriented using the extended mode.")
             else :
                 _text = catalog.i18nc("@info:status", "All selected objects have been oriented.")
@@ -2,53 +2,271 @@ from UM.Job import Job
 from UM.Operations.GroupedOperation import GroupedOperation
 from UM.Operations.RotateOperation import RotateOperation
 from cura.CuraApplication import CuraApplication
-from .MeshTweaker import Tweak
+from .MeshTweaker import Tweak, TweakCancelled
+from .OrientationCache import OrientationCache
+from .MeshInstances import instance_groups, map_result
+from .OrientationWorker import summarize
+from .PlateOrientation import choose_orientations, PLATE_CANDIDATES, PLATE_FILL
 from UM.Math.Quaternion import Quaternion
 from UM.Math.Vector import Vector
 from UM.Scene.SceneNode import SceneNode
 from UM.Logger import Logger
+from UM.i18n import i18nCatalog
 import math
+import numpy
+import os
+import sys
 
-from typing import List, TYPE_CHECKING, Optional
+from typing import Any, Dict, List, TYPE_CHECKING, Optional, Tuple
 
 if TYPE_CHECKING:
     from UM.Message import Message
+    from .OrientationService import OrientationClient
+    from .ParameterProfiles import ParameterProfile
+
+catalog = i18nCatalog("autorotationtool")
 
 
 class CalculateOrientationJob(Job):
-    def __init__(self, nodes: List[SceneNode], extended_mode: bool = False, message: Optional["Message"] = None) -> None:
+    def __init__(self, nodes: List[SceneNode], extended_mode: bool = False, message: Optional["Message"] = None, processes: int = 1, cache: Optional[OrientationCache] = None, plate_area: Optional[float] = None, profiles: Optional[List[Optional["ParameterProfile"]]] = None, worker: Optional["OrientationClient"] = None) -> None:
         super().__init__()
         self._message = message
         self._nodes = nodes
         self._extended_mode = extended_mode
+        self._processes = processes
+        self._cache = cache
+        # With the area of the build plate, the orientations of all nodes are chosen together to fit onto the plate
+        self._plate_area = plate_area
+        # Parameter profile of each node, e.g. chosen by its material, None for the default parameters
+        self._profiles = profiles if profiles is not None else [None] * len(nodes)
+        # Client of the long-lived worker process, None to orient the nodes in Cura's process (or the process pool)
+        self._worker = worker
+        self._node_progress = []  # type: List[float]
+        self._cancelled = False
+        self._applied = []  # type: List[RotateOperation]
+        self._oriented_count = 0
+        # Copies of the same mesh (e.g. made with multiply) of each reference node, with the rotation onto the reference
+        self._instances = {}  # type: Dict[int, List[Tuple[int, numpy.ndarray]]]
+        self._results = []  # type: List[Optional[Dict[str, Any]]]
+
+    def cancel(self) -> None:
+        # Cooperative cancellation, the Tweaks stop at their next check and the finished nodes stay oriented
+        self._cancelled = True
+
+    def isCancelled(self) -> bool:
+        return self._cancelled
+
+    def getOrientedCount(self) -> int:
+        return self._oriented_count
 
     def run(self) -> None:
-        op = GroupedOperation()
+        tweak_arguments = {"extended_mode": self._extended_mode,
+                           "min_volume": bool(CuraApplication.getInstance().getPreferences().getValue("OrientationPlugin/min_volume"))}
+        if self._plate_area is not None:
+            tweak_arguments["footprints"] = PLATE_CANDIDATES
+        self._node_progress = [0.0] * len(self._nodes)
 
-        for node in self._nodes:
-            transformed_vertices = node.getMeshDataTransformed().getVertices()
-            Logger.log('d', 'transformed_vertices : ' + str(transformed_vertices)) 
+        results = [None] * len(self._nodes)  # type: List[Optional[Dict[str, Any]]]
+        self._results = results
+        self._keys = [None] * len(self._nodes)  # type: List[Optional[str]]
+        references = self._groupInstances()
+        try:
+            if self._cache is not None:
+                for index in range(len(self._nodes)):
+                    if results[index] is not None:
+                        continue  # a copy whose reference was found in the cache
+                    node = self._nodes[index]
+                    mesh_data = node.getMeshData()
+                    profile = self._profiles[index]
+                    self._keys[index] = self._cache.key(mesh_data.getVertices(), tweak_arguments, node.getWorldTransformation().getData(), mesh_data.getIndices(),
+                                                        parameter = profile.parameter(tweak_arguments["min_volume"]) if profile is not None else None, profile = profile.key() if profile is not None else None)
+                    results[index] = self._cache.get(self._keys[index])
+                    if results[index] is not None:
+                        self._finishNode(index, results[index], computed = False)
+                Logger.log("d", "{} of {} orientations found in the cache".format(len(self._nodes) - results.count(None), len(self._nodes)))
+            # the copies are finished together with their reference
+            pending = [index for index, result in enumerate(results) if result is None and references[index] == index]
 
-            result = Tweak(transformed_vertices, extended_mode = self._extended_mode, verbose=False, progress_callback=self.updateProgress, min_volume=CuraApplication.getInstance().getPreferences().getValue("OrientationPlugin/min_volume"))
+            if self._worker is not None and pending:
+                try:
+                    self._runWorker(pending, results, tweak_arguments)
+                except TweakCancelled:
+                    raise
+                except Exception:
+                    Logger.logException("w", "Orientation in the worker process failed, falling back to Cura's process")
+            elif self._processes > 1 and len(pending) > 1:
+                try:
+                    self._runParallel(pending, results, tweak_arguments)
+                except TweakCancelled:
+                    raise
+                except Exception:
+                    Logger.logException("w", "Parallel orientation failed, falling back to a single thread")
+            self._runSerial([index for index in pending if results[index] is None], results, tweak_arguments)
+        except TweakCancelled:
+            Logger.log("i", "Orientation cancelled, {} of {} nodes have been oriented".format(self._oriented_count, len(self._nodes)))
 
-            [v, phi] = result.euler_parameter
+        if self._plate_area is not None:
+            self._applyPlate(results)
+        # All rotations, also those of a cancelled job, are pushed as a single undo step
+        CuraApplication.getInstance().callLater(self._pushApplied)
 
-            # Convert the new orientation into quaternion
-            new_orientation = Quaternion.fromAngleAxis(phi, Vector(-v[0], -v[1], -v[2]))
-            # Rotate the axis frame.
-            rotation = Quaternion.fromAngleAxis(-0.5 * math.pi, Vector(1, 0, 0))
-            new_orientation = rotation * new_orientation
+    def _finishNode(self, index: int, result: Dict[str, Any], computed: bool = True) -> None:
+        # Called in the job thread for each node as soon as its orientation is known
+        node = self._nodes[index]
+        if computed:
+            if self._profiles[index] is not None:
+                result["profile"] = self._profiles[index].key()
+            self._logStats(node, result)
+            if self._cache is not None:
+                self._cache.put(self._keys[index], result)
+        self._oriented_count += 1
+        self._updateNodeProgress(index, 100)
+        if self._message:
+            self._message.setText(catalog.i18nc("@info:status", "Calculating the optimal orientation... {done} of {total} models oriented").format(done = self._oriented_count, total = len(self._nodes)))
+        if self._plate_area is None:
+            CuraApplication.getInstance().callLater(self._applyResult, node, result)
+        for instance, rotation in self._instances.pop(index, []):
+            if self._results[instance] is None:
+                self._results[instance] = map_result(result, rotation)
+                if self._cache is not None and self._keys[instance] is not None:
+                    self._cache.put(self._keys[instance], self._results[instance])
+                self._finishNode(instance, self._results[instance], computed = False)
 
-            # Ensure node gets the new orientation, and rotate it around the center of the object.
-            # The rotating around the center prevents it from getting all kinds of weird new positions on the buildplate
-            op.addOperation(RotateOperation(node, new_orientation, rotate_around_point = node.getBoundingBox().center))
+    def _groupInstances(self) -> List[int]:
+        # Nodes with the same mesh data and a transformation that differs only by a rotation and translation are oriented
+        # once, the result of the first node is mapped onto the others
+        profiles = [profile.key() if profile is not None else None for profile in self._profiles]
+        references, rotations = instance_groups([self._getMesh(index) for index in range(len(self._nodes))], profiles)
+        self._instances = {}
+        for index, (reference, rotation) in enumerate(zip(references, rotations)):
+            if reference != index:
+                self._instances.setdefault(reference, []).append((index, rotation))
+        if self._instances:
+            Logger.log("d", "{} nodes are copies of {} unique meshes".format(
+                sum(len(instances) for instances in self._instances.values()), len(self._instances)))
+        return references
 
-            Job.yieldThread()
+    def _applyPlate(self, results: List[Optional[Dict[str, Any]]]) -> None:
+        # The orientations of the build plate depend on each other, so they are chosen when all nodes are finished
+        finished = [index for index, result in enumerate(results) if result is not None]
+        candidates = [results[index].get("candidates") or [results[index]] for index in finished]
+        chosen = choose_orientations([[(candidate["unprintability"], candidate.get("footprint", 0)) for candidate in node_candidates] for node_candidates in candidates], PLATE_FILL * self._plate_area)
+        footprint = 0.0
+        for index, node_candidates, choice in zip(finished, candidates, chosen):
+            footprint += node_candidates[choice].get("footprint", 0)
+            CuraApplication.getInstance().callLater(self._applyResult, self._nodes[index], node_candidates[choice])
+        Logger.log("d", "Build plate orientation: {} of {} nodes changed to a smaller footprint, {:.0f} of {:.0f} mm² used".format(
+            len(chosen) - chosen.count(0), len(chosen), footprint, self._plate_area))
+
+    def _applyResult(self, node: SceneNode, result: Dict[str, Any]) -> None:
+        # Runs on the main thread, the node is rotated at once so the user sees the results while the job continues
+        [v, phi] = result["euler_parameter"]
+
+        # Convert the new orientation into quaternion
+        new_orientation = Quaternion.fromAngleAxis(phi, Vector(-v[0], -v[1], -v[2]))
+        # Rotate the axis frame.
+        rotation = Quaternion.fromAngleAxis(-0.5 * math.pi, Vector(1, 0, 0))
+        new_orientation = rotation * new_orientation
+
+        # Ensure node gets the new orientation, and rotate it around the center of the object.
+        # The rotating around the center prevents it from getting all kinds of weird new positions on the buildplate
+        operation = RotateOperation(node, new_orientation, rotate_around_point = node.getBoundingBox().center)
+        operation.redo()
+        self._applied.append(operation)
+
+    def _pushApplied(self) -> None:
+        # Runs on the main thread after all _applyResult calls. Pushing redoes the operations, so the applied
+        # rotations are reverted first and the whole batch becomes one undo step.
+        if not self._applied:
+            return
+        op = GroupedOperation()
+        for operation in reversed(self._applied):
+            operation.undo()
+        for operation in self._applied:
+            op.addOperation(operation)
+        self._applied = []
         op.push()
 
+    def _getMesh(self, index: int) -> Tuple["numpy.ndarray", Optional["numpy.ndarray"], "numpy.ndarray"]:
+        # The local vertices and indices of the mesh data are handed over as they are, the Tweak applies the world
+        # transformation in its own buffers. This avoids the transformed and de-indexed copies of the mesh.
+        node = self._nodes[index]
+        mesh_data = node.getMeshData()
+        return mesh_data.getVertices(), mesh_data.getIndices(), node.getWorldTransformation().getData()
+
+    def _getTweakArguments(self, index: int, tweak_arguments: Dict[str, Any]) -> Dict[str, Any]:
+        profile = self._profiles[index]
+        if profile is None:
+            return tweak_arguments
+        return dict(tweak_arguments, parameter = profile.parameter(tweak_arguments["min_volume"]))
+
+    def _runSerial(self, pending: List[int], results: List[Optional[Dict[str, Any]]], tweak_arguments: Dict[str, Any]) -> None:
+        for index in pending:
+            if self._cancelled:
+                raise TweakCancelled()
+            vertices, indices, transformation = self._getMesh(index)
+
+            result = Tweak(vertices, verbose=False, progress_callback=lambda progress, index=index: self._updateNodeProgress(index, progress), cancel_callback=self.isCancelled, indices=indices, transformation=transformation, **self._getTweakArguments(index, tweak_arguments))
+            results[index] = summarize(result)
+            self._finishNode(index, results[index])
+
+            Job.yieldThread()
+
+    def _runParallel(self, pending: List[int], results: List[Optional[Dict[str, Any]]], tweak_arguments: Dict[str, Any]) -> None:
+        # The worker processes unpickle the task by its top level module name, so the plugin folder has to be on the path.
+        plugin_path = os.path.dirname(os.path.abspath(__file__))
+        if plugin_path not in sys.path:
+            sys.path.append(plugin_path)
+        import OrientationWorker
+
+        meshes = [self._getMesh(index) + (self._getTweakArguments(index, tweak_arguments),) for index in pending]
+        Logger.log("d", "Orienting {} nodes in {} processes".format(len(meshes), self._processes))
+
+        progress_callback = lambda mesh_index, progress: self._updateNodeProgress(pending[mesh_index], progress)
+        try:
+            for mesh_index, result in OrientationWorker.orient_all(meshes, self._processes, tweak_arguments, progress_callback, self.isCancelled):
+                results[pending[mesh_index]] = result
+                self._finishNode(pending[mesh_index], result)
+        except OrientationWorker.TweakCancelled:
+            # the top level module of the workers defines its own exception class
+            raise TweakCancelled()
+
+    def _runWorker(self, pending: List[int], results: List[Optional[Dict[str, Any]]], tweak_arguments: Dict[str, Any]) -> None:
+        # The client was imported as a top level module by the tool, as the worker process needs it that way
+        import OrientationService
+
+        meshes = [self._getMesh(index) + (self._getTweakArguments(index, tweak_arguments),) for index in pending]
+        Logger.log("d", "Orienting {} nodes in the worker process".format(len(meshes)))
+
+        progress_callback = lambda mesh_index, progress: self._updateNodeProgress(pending[mesh_index], progress)
+        try:
+            for mesh_index, result in self._worker.orient_all(meshes, tweak_arguments, progress_callback, self.isCancelled):
+                results[pending[mesh_index]] = result
+                self._finishNode(pending[mesh_index], result)
+        except OrientationService.TweakCancelled:
+            # the top level module of the worker defines its own exception class
+            raise TweakCancelled()
+
+    def _logStats(self, node: SceneNode, result: Dict[str, Any]) -> None:
+        stats = result.get("stats", {})
+        stages = ["{}={:.3f}s".format(stage, stats[stage]) for stage in ("preprocess", "area_cumulation", "candidates", "scoring", "refine", "total") if stage in stats]
+        Logger.log("d", "Orientation of {}: {} faces ({} after filtering), {} orientations, {:.2f} ms per orientation, {}".format(
+            node.getName(), stats.get("faces_input"), stats.get("faces"), stats.get("orientations"),
+            1000 * stats.get("scoring_per_orientation", 0), " ".join(stages)))
+
+    def _updateNodeProgress(self, index: int, progress: float) -> None:
+        self._node_progress[index] = progress
+        self.updateProgress(sum(self._node_progress) / len(self._node_progress))
+
     def updateProgress(self, progress):
         if self._message:
             self._message.setProgress(progress)
 
+    def getPlateArea(self) -> Optional[float]:
+        return self._plate_area
+
+    def getNodes(self) -> List[SceneNode]:
+        return self._nodes
+
     def getMessage(self) -> Optional["Message"]:
-        return self._message
\ No newline at end of file
+        return self._message
@@ -0,0 +1,40 @@
+from UM.Job import Job
+from UM.Logger import Logger
+from UM.Scene.SceneNode import SceneNode
+from .MeshTweaker import OrientationAnalyzer
+import numpy
+
+from typing import Any, Dict, List, Tuple
+
+
+class CheckPrintabilityJob(Job):
+    """Preprocesses the meshes of the nodes to check, so Cura doesn't freeze while large meshes are prepared.
+    Only the scoring of the current orientation with the finished analyzers is left to the main thread."""
+
+    def __init__(self, nodes: List[SceneNode], min_volume: bool, requests: List[Tuple[Any, Any, Any, "numpy.ndarray", Dict[str, Any]]]) -> None:
+        super().__init__()
+        self._nodes = nodes
+        self._min_volume = min_volume
+        # (cache key, mesh data, mode, world transformation, keyword arguments of the analyzer) of each missing analyzer
+        self._requests = requests
+        self._entries = []  # type: List[Tuple[Any, Tuple[Any, Any, OrientationAnalyzer, "numpy.ndarray"]]]
+
+    def run(self) -> None:
+        for key, mesh_data, mode, transformation, arguments in self._requests:
+            try:
+                # The mesh is preprocessed in the coordinates of its current world transformation
+                analyzer = OrientationAnalyzer(mesh_data.getVertices(), indices = mesh_data.getIndices(), transformation = transformation, **arguments)
+            except Exception:
+                Logger.logException("w", "Could not preprocess the mesh to check its printability")
+                continue
+            self._entries.append((key, (mesh_data, mode, analyzer, transformation)))
+            Job.yieldThread()
+
+    def getEntries(self) -> List[Tuple[Any, Tuple[Any, Any, OrientationAnalyzer, "numpy.ndarray"]]]:
+        return self._entries
+
+    def getNodes(self) -> List[SceneNode]:
+        return self._nodes
+
+    def getMinVolume(self) -> bool:
+        return self._min_volume
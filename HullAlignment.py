@@ -0,0 +1,103 @@
+#
+# Copyright (c) 2023 5@xes
+# AutoRotationTool is released under the terms of the AGPLv3 or higher.
+#
+# Alignment of the 2D convex hulls of several models at once: the longest edge, the minimum area bounding rectangle
+# and the principal axis of each hull are calculated with numpy on all hulls together.
+# This module must not import UM/Cura/PyQt, so it can be used outside of Cura as well.
+#
+
+import numpy as np
+
+# Rectangles whose sides differ less than this ratio have no main direction, the principal axis is used instead
+SQUARE_TOLERANCE = 0.02
+# Minimal anisotropy of the area moments for the principal axis to be used
+PRINCIPAL_TOLERANCE = 0.05
+
+
+def pad_hulls(hulls):
+    """Stacking hulls of different length into one array, shorter hulls repeat their last point.
+    The repeated points add edges of length zero, the closing edge to the first point stays the same.
+    Args:
+        hulls (list): points of each hull with format point_count x 2, in their order along the hull
+    Returns:
+        points with format hull_count x max_point_count x 2
+    """
+    hulls = [np.asarray(hull, dtype=np.float64).reshape(-1, 2) for hull in hulls]
+    points = np.zeros((len(hulls), max([len(hull) for hull in hulls] + [1]), 2))
+    for i, hull in enumerate(hulls):
+        if len(hull) > 0:
+            points[i, :len(hull)] = hull
+            points[i, len(hull):] = hull[-1]
+    return points
+
+
+def axis_angle(vectors):
+    """Returns the rotation angle around the vertical axis that turns each vector (or its opposite) parallel to x,
+    within (-pi / 2, pi / 2], so a model is never turned by more than a quarter turn."""
+    angles = np.arctan2(vectors[..., 1], vectors[..., 0])
+    angles = np.where(angles > np.pi / 2, angles - np.pi, angles)
+    return np.where(angles <= -np.pi / 2, angles + np.pi, angles)
+
+
+def hull_alignments(hulls):
+    """Calculating the alignment of several convex hulls in one pass.
+    The minimum area rectangle has one side on an edge of the hull, so all hull points are projected onto all
+    edge directions at once, as the rotating calipers would visit them.
+    Args:
+        hulls (list): points of each hull with format point_count x 2, for Cura these are the x and z coordinates
+    Returns:
+        dict of arrays with one row per hull:
+        "edge": angle of the longest edge,
+        "rectangle": angle of the long side of the minimum area rectangle and "extents" its length and width,
+        "principal": angle of the principal axis of the hull area and "anisotropy" its strength (0 for a circle),
+        "side": angle of the side alignment (the longest edge),
+        "main": angle of the main alignment (the rectangle, or the principal axis if the rectangle is a square)
+        The angles rotate the hull counter clockwise (from x towards y) onto the x axis.
+    """
+    points = pad_hulls(hulls)
+    points = points - np.mean(points, axis=1, keepdims=True)
+    edges = np.roll(points, -1, axis=1) - points
+    lengths = np.linalg.norm(edges, axis=2)
+    rows = np.arange(len(points))
+
+    # longest edge
+    longest = np.argmax(lengths, axis=1)
+    edge = axis_angle(edges[rows, longest])
+
+    # minimum area rectangle, the projections onto the edges and their normals have format
+    # hull_count x (2 * edge_count) x point_count
+    directions = edges / np.where(lengths > 0, lengths, 1)[..., None]
+    projections = np.matmul(np.concatenate([directions, directions[..., ::-1] * [-1, 1]], axis=1),
+                            points.transpose(0, 2, 1))
+    sizes = np.ptp(projections, axis=2).reshape(len(points), 2, -1).transpose(0, 2, 1)
+    areas = np.where(lengths > 0, sizes[..., 0] * sizes[..., 1], np.inf)
+    best = np.argmin(areas, axis=1)
+    extents = sizes[rows, best]
+    side_vectors = directions[rows, best]
+    long_vectors = np.where((extents[:, 0] >= extents[:, 1])[:, None], side_vectors,
+                            side_vectors[:, ::-1] * [-1, 1])
+    rectangle = axis_angle(long_vectors)
+    extents = np.sort(extents, axis=1)[:, ::-1]
+
+    # second moments of the hull area with the shoelace formula
+    x, y = points[..., 0], points[..., 1]
+    x1, y1 = np.roll(x, -1, axis=1), np.roll(y, -1, axis=1)
+    cross = x * y1 - x1 * y
+    area = np.sum(cross, axis=1) / 2
+    safe_area = np.where(np.abs(area) > 1e-12, area, 1)
+    cx = np.sum((x + x1) * cross, axis=1) / (6 * safe_area)
+    cy = np.sum((y + y1) * cross, axis=1) / (6 * safe_area)
+    cxx = np.sum((x * x + x * x1 + x1 * x1) * cross, axis=1) / (12 * safe_area) - cx * cx
+    cyy = np.sum((y * y + y * y1 + y1 * y1) * cross, axis=1) / (12 * safe_area) - cy * cy
+    cxy = np.sum((x * y1 + 2 * x * y + 2 * x1 * y1 + x1 * y) * cross, axis=1) / (24 * safe_area) - cx * cy
+    principal = 0.5 * np.arctan2(2 * cxy, cxx - cyy)
+    spread = cxx + cyy
+    anisotropy = np.where((np.abs(area) > 1e-12) & (spread > 0),
+                          np.sqrt((cxx - cyy) ** 2 + 4 * cxy ** 2) / np.where(spread > 0, spread, 1), 0)
+    principal = np.where(anisotropy > 0, axis_angle(np.stack([np.cos(principal), np.sin(principal)], axis=1)), edge)
+
+    square = extents[:, 0] <= (1 + SQUARE_TOLERANCE) * extents[:, 1]
+    main = np.where(square & (anisotropy > PRINCIPAL_TOLERANCE), principal, rectangle)
+    return {"edge": edge, "rectangle": rectangle, "extents": extents, "principal": principal,
+            "anisotropy": anisotropy, "side": edge, "main": main}
@@ -0,0 +1,107 @@
+#
+# Copyright (c) 2023 5@xes
+# AutoRotationTool is released under the terms of the AGPLv3 or higher.
+#
+# Reading and writing of ASCII and binary STL files as plain vertex arrays for the MeshTweaker.
+# This module must not import UM/Cura/PyQt, so it can be used outside of Cura as well.
+#
+
+import os
+import re
+
+import numpy as np
+
+# Record of a face in a binary STL file
+STL_FACE = np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")])
+STL_HEADER_SIZE = 80
+# Faces per chunk of stl_chunks, about 2.4 MB of float32 vertices
+STL_CHUNK_FACES = 65536
+
+_VERTEX = re.compile(rb"vertex\s+(\S+)\s+(\S+)\s+(\S+)")
+
+
+def is_binary_stl(path):
+    """Checking whether an STL file is binary, by comparing its size with the face count of the header.
+    ASCII files start with "solid", but so do some binary files, so the size is checked first.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.read(STL_HEADER_SIZE + 4)
+    if len(header) == STL_HEADER_SIZE + 4:
+        face_count = int(np.frombuffer(header[STL_HEADER_SIZE:], dtype="<u4")[0])
+        if size == STL_HEADER_SIZE + 4 + face_count * STL_FACE.itemsize:
+            return True
+    return not header.lstrip().startswith(b"solid")
+
+
+def load_stl(path):
+    """Loading the vertices of an ASCII or binary STL file.
+    Args:
+        path (str): STL file
+    Returns:
+        vertices with format (face_count * 3) x 3, float32 for binary files
+    """
+    if is_binary_stl(path):
+        with open(path, "rb") as f:
+            f.seek(STL_HEADER_SIZE)
+            face_count = np.fromfile(f, dtype="<u4", count=1)
+            faces = np.fromfile(f, dtype=STL_FACE, count=int(face_count[0]) if len(face_count) else 0)
+        vertices = faces["vertices"].reshape(-1, 3)
+    else:
+        with open(path, "rb") as f:
+            data = f.read()
+        vertices = np.array(_VERTEX.findall(data), dtype=np.float64).reshape(-1, 3)
+    if len(vertices) == 0 or len(vertices) % 3:
+        raise ValueError("{} is not a valid STL file".format(path))
+    return vertices
+
+
+def stl_chunks(path, face_chunk=STL_CHUNK_FACES):
+    """Reading the vertices of an STL file in chunks, for the streamed preprocess of the MeshTweaker.
+    Binary files are memory mapped, so only the current chunk is read into memory. ASCII files are loaded at once.
+    Args:
+        path (str): STL file
+        face_chunk (int): faces per chunk
+    Yields:
+        vertices with format (chunk_face_count * 3) x 3, float32 for binary files
+    """
+    if not is_binary_stl(path):
+        vertices = load_stl(path)
+        for start in range(0, len(vertices), 3 * face_chunk):
+            yield vertices[start:start + 3 * face_chunk]
+        return
+    with open(path, "rb") as f:
+        f.seek(STL_HEADER_SIZE)
+        face_count = np.fromfile(f, dtype="<u4", count=1)
+    # as np.fromfile in load_stl, a truncated file is read up to its last complete face
+    face_count = min(int(face_count[0]) if len(face_count) else 0,
+                     (os.path.getsize(path) - STL_HEADER_SIZE - 4) // STL_FACE.itemsize)
+    if face_count <= 0:
+        raise ValueError("{} is not a valid STL file".format(path))
+    faces = np.memmap(path, dtype=STL_FACE, mode="r", offset=STL_HEADER_SIZE + 4, shape=(face_count,))
+    try:
+        for start in range(0, face_count, face_chunk):
+            yield np.array(faces["vertices"][start:start + face_chunk]).reshape(-1, 3)
+    finally:
+        del faces
+
+
+def save_stl(path, vertices, name="AutoRotationTool"):
+    """Writing vertices as binary STL file, the normals are calculated from the vertices.
+    Args:
+        path (str): STL file
+        vertices (np.array): vertices with format (face_count * 3) x 3
+        name (str): written into the header
+    """
+    triangles = np.asarray(vertices, dtype=np.float64).reshape(-1, 3, 3)
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+    faces = np.zeros(len(triangles), dtype=STL_FACE)
+    faces["normal"] = normals
+    faces["vertices"] = triangles
+    with open(path, "wb") as f:
+        f.write(name.encode("ascii", "replace")[:STL_HEADER_SIZE].ljust(STL_HEADER_SIZE, b" "))
+        f.write(np.array([len(faces)], dtype="<u4").tobytes())
+        faces.tofile(f)
@@ -0,0 +1,170 @@
+#
+# Copyright (c) 2023 5@xes
+# AutoRotationTool is released under the terms of the AGPLv3 or higher.
+#
+# Detection of copies of the same mesh in a selection, e.g. made with Cura's multiply or by loading a file several
+# times. The copies differ only by a rotation and a translation of their world transformation, so the orientation is
+# calculated once per group and mapped onto the other copies through their transformations.
+# This module must not import UM/Cura/PyQt, so it can be used outside of Cura as well.
+#
+
+import hashlib
+
+import numpy as np
+
+# Decimals of the rotation invariant part of the transformations in the signature
+SIGNATURE_DECIMALS = 6
+# Maximal deviation of the mapping between two copies from a rotation
+ROTATION_TOLERANCE = 1e-6
+
+
+def shape_signature(vertices, indices=None, transformation=None, extra=None, digests=None):
+    """Calculating a signature of a mesh in world coordinates that doesn't change with its rotation and translation.
+    The local vertices and indices are hashed, of the transformation only the Gram matrix L^T L of its linear part L
+    (the scale and shear, but not the rotation) and the sign of its determinant (a mirror) are used.
+    Args:
+        vertices (np.array): vertices of the mesh in its local coordinates
+        indices (np.array): face indices of an indexed mesh
+        transformation (np.array): 4 x 4 world transformation of the mesh
+        extra (object): further values of the signature, e.g. the parameters of the Tweak
+        digests (dict): digests of the arrays by their id, so an array shared by several nodes is hashed once
+    Returns:
+        hashable signature
+    """
+    digests = digests if digests is not None else dict()
+    arrays = list()
+    for array in (vertices, indices):
+        if array is None:
+            arrays.append(None)
+            continue
+        if id(array) not in digests:
+            digest = hashlib.blake2b(digest_size=20)
+            digest.update(repr((np.asarray(array).shape, np.asarray(array).dtype.str)).encode("utf-8"))
+            digest.update(np.ascontiguousarray(array).tobytes())
+            digests[id(array)] = digest.hexdigest()
+        arrays.append(digests[id(array)])
+    linear = _linear(transformation)
+    gram = np.round(linear.T @ linear, decimals=SIGNATURE_DECIMALS) + 0.0
+    return tuple(arrays) + (tuple(gram.ravel().tolist()), bool(np.linalg.det(linear) > 0), repr(extra))
+
+
+def _linear(transformation):
+    if transformation is None:
+        return np.identity(3)
+    return np.asarray(transformation, dtype=np.float64)[:3, :3]
+
+
+def instance_rotation(transformation, reference):
+    """Calculating the rotation R that maps a copy onto the reference in world coordinates, L_ref = R L.
+    Returns:
+        the 3 x 3 rotation or None if the transformations differ by more than a rotation
+    """
+    linear = _linear(transformation)
+    try:
+        rotation = _linear(reference) @ np.linalg.inv(linear)
+    except np.linalg.LinAlgError:
+        return None
+    if np.max(np.abs(rotation.T @ rotation - np.identity(3))) > ROTATION_TOLERANCE or np.linalg.det(rotation) <= 0:
+        return None
+    return rotation
+
+
+def instance_groups(meshes, extras=None):
+    """Grouping the copies of the same mesh.
+    The meshes are bucketed by their shape_signature and checked exactly against the first mesh of their bucket:
+    equal local vertices and indices, and transformations that differ by a rotation.
+    Args:
+        meshes (list): (vertices, indices, transformation) of each mesh
+        extras (list): further values of the signature of each mesh, e.g. the parameters of its Tweak
+    Returns:
+        index of the reference mesh of each mesh (its own index for the references) and the rotation that maps it
+        onto its reference (None for the references)
+    """
+    references = list(range(len(meshes)))
+    rotations = [None] * len(meshes)
+    buckets = dict()
+    digests = dict()
+    for index, (vertices, indices, transformation) in enumerate(meshes):
+        signature = shape_signature(vertices, indices, transformation, extras[index] if extras else None, digests)
+        for reference in buckets.setdefault(signature, list()):
+            reference_vertices, reference_indices, reference_transformation = meshes[reference]
+            if not (_same(vertices, reference_vertices) and _same(indices, reference_indices)):
+                continue
+            rotation = instance_rotation(transformation, reference_transformation)
+            if rotation is not None:
+                references[index] = reference
+                rotations[index] = rotation
+                break
+        else:
+            buckets[signature].append(index)
+    return references, rotations
+
+
+def _same(array, other):
+    if array is other:
+        return True
+    if array is None or other is None:
+        return False
+    return np.array_equal(array, other)
+
+
+def rotation_matrix(axis, angle):
+    """Returns the matrix of a rotation by the angle (in rad) around the axis."""
+    x, y, z = np.asarray(axis, dtype=np.float64) / np.linalg.norm(axis)
+    c, s = np.cos(angle), np.sin(angle)
+    return np.array([[x * x * (1 - c) + c, x * y * (1 - c) - z * s, x * z * (1 - c) + y * s],
+                     [y * x * (1 - c) + z * s, y * y * (1 - c) + c, y * z * (1 - c) - x * s],
+                     [z * x * (1 - c) - y * s, z * y * (1 - c) + x * s, z * z * (1 - c) + c]])
+
+
+def rotation_axis_angle(rotation):
+    """Returns the axis and angle (in rad, within [0, pi]) of a rotation matrix, by way of its quaternion."""
+    m = np.asarray(rotation, dtype=np.float64)
+    trace = np.trace(m)
+    # the largest of the four quaternion components is calculated first, the others are derived from it
+    diagonal = int(np.argmax(np.diag(m)))
+    if trace >= m[diagonal, diagonal]:
+        w = np.sqrt(max(1 + trace, 0)) / 2
+        xyz = np.array([m[2, 1] - m[1, 2], m[0, 2] - m[2, 0], m[1, 0] - m[0, 1]]) / (4 * w)
+    else:
+        i, j, k = diagonal, (diagonal + 1) % 3, (diagonal + 2) % 3
+        xyz = np.zeros(3)
+        xyz[i] = np.sqrt(max(1 + m[i, i] - m[j, j] - m[k, k], 0)) / 2
+        xyz[j] = (m[j, i] + m[i, j]) / (4 * xyz[i])
+        xyz[k] = (m[k, i] + m[i, k]) / (4 * xyz[i])
+        w = (m[k, j] - m[j, k]) / (4 * xyz[i])
+    if w < 0:
+        w, xyz = -w, -xyz
+    length = np.linalg.norm(xyz)
+    if length < 1e-12:
+        return [1.0, 0.0, 0.0], 0.0
+    return [float(i) for i in xyz / length], float(2 * np.arctan2(length, w))
+
+
+def _map_euler(euler_parameter, rotation):
+    # The Tweak rotates the mesh by its matrix M = rotation_matrix(v, phi) as row vectors, so by M^T = rotation_matrix
+    # (-v, phi) as column vectors. The copy is first rotated onto the reference and then like the reference.
+    [v, phi] = euler_parameter
+    mapped = rotation_matrix(-np.asarray(v, dtype=np.float64), phi) @ rotation
+    axis, angle = rotation_axis_angle(mapped)
+    return [[-i for i in axis], angle], mapped.T
+
+
+def map_result(result, rotation):
+    """Mapping the summarized results of a reference (see OrientationWorker.summarize) onto a copy.
+    The scores stay the same, the rotations are combined with the rotation from the copy onto the reference.
+    Args:
+        result (dict): results of the reference
+        rotation (np.array): rotation from the copy onto the reference, see instance_rotation
+    Returns:
+        results of the copy
+    """
+    mapped = dict(result)
+    mapped["euler_parameter"], matrix = _map_euler(result["euler_parameter"], rotation)
+    mapped["matrix"] = matrix.tolist()
+    if "alignment" in result:
+        mapped["alignment"] = (rotation.T @ np.asarray(result["alignment"], dtype=np.float64)).tolist()
+    if "candidates" in result:
+        mapped["candidates"] = [dict(candidate, euler_parameter=_map_euler(candidate["euler_parameter"], rotation)[0])
+                                for candidate in result["candidates"]]
+    return mapped
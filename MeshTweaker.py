@@ -4,9 +4,15 @@ import re
 import math
 from time import time, sleep
 from collections import Counter
+from collections.abc import Iterator
 # upgrade numpy with: "pip install numpy --upgrade"
 import numpy as np
 
+try:
+    from .StablePoses import convex_hull, center_of_mass, stable_planes, farthest_vertices
+except ImportError:
+    from StablePoses import convex_hull, center_of_mass, stable_planes, farthest_vertices
+
 
 # These parameter were minimized by the evolutionary algorithm
 # https://github.com/ChristophSchranz/Tweaker-3_optimize-using-ea, branch ea-optimize_20200414' on 100 objects
@@ -54,6 +60,211 @@ PARAMETER_VOL = {
     "height_log_k": 0.3933594673063997
 }
 
+# Parameter sets with their derived constants, see compile_parameter
+_COMPILED_PARAMETERS = dict()
+COMPILED_PARAMETER_COUNT = 64
+
+
+def validate_parameter(parameter):
+    """Checking that a parameter set has the keys of PARAMETER and finite numbers as values.
+    Raises:
+        ValueError: with the missing, unknown or invalid keys
+    """
+    missing = sorted(set(PARAMETER) - set(parameter))
+    unknown = sorted(set(parameter) - set(PARAMETER))
+    invalid = sorted(key for key, value in parameter.items() if isinstance(value, bool) or
+                     not isinstance(value, (int, float)) or not math.isfinite(value))
+    if missing or unknown or invalid:
+        raise ValueError("Invalid parameter set, missing: {}, unknown: {}, not a finite number: {}".format(
+            ", ".join(missing) or "-", ", ".join(unknown) or "-", ", ".join(invalid) or "-"))
+
+
+def compile_parameter(parameter):
+    """Validating a parameter set and calculating its derived constants, once per distinct set.
+    Returns:
+        dict with the parameters and the derived constants, to be copied onto a Tweak
+    """
+    key = tuple(sorted(parameter.items()))
+    compiled = _COMPILED_PARAMETERS.get(key)
+    if compiled is None:
+        validate_parameter(parameter)
+        compiled = dict(parameter)
+        if abs(compiled["OV_H"] - 2) < 0.1:  # set to nearby integers as they are faster
+            compiled["OV_H"] = 2
+        if abs(compiled["OV_H"] - 1) < 0.1:
+            compiled["OV_H"] = 1
+        # the extended mode keeps smaller faces for the contour
+        compiled["NEGL_FACE_SIZE_EXTENDED"] = 0.1 * compiled["NEGL_FACE_SIZE"]
+        if len(_COMPILED_PARAMETERS) >= COMPILED_PARAMETER_COUNT:
+            _COMPILED_PARAMETERS.clear()
+        _COMPILED_PARAMETERS[key] = compiled
+    return compiled
+
+
+# Upper bound of the scratch memory (in bytes) used while scoring the candidate orientations. The orientations
+# are evaluated in chunks, so that faces x orientations x BYTES_PER_FACE_ORIENTATION never exceeds this budget.
+MEMORY_BUDGET = 128 * 1024 * 1024
+BYTES_PER_FACE_ORIENTATION = 96
+
+# Candidate generators of the extended mode, the death star samples random faces while the sphere histogram bins
+# the normals deterministically into an icosphere of the given subdivision level (level 4 has 2562 cells of ~4 deg).
+# The stable poses are the planes of the convex hull the part can rest on, only these (up to STABLE_POSES of the
+# largest support area) and the current orientation are scored.
+CANDIDATE_GENERATORS = ("death_star", "sphere_histogram", "stable_poses")
+ICOSPHERE_LEVEL = 4
+STABLE_POSES = 24
+_ICOSPHERES = dict()
+
+# Estimators of the support of the min_volume mode: "centroid" uses the height of the overhanging faces above the
+# lowest point, "raster" samples the surface and measures the height of each overhang above the plate or the part
+# below it in the cells of a grid with SUPPORT_GRID cells along the larger side of the part.
+SUPPORT_ESTIMATORS = ("centroid", "raster")
+SUPPORT_GRID = 64
+SUPPORT_SAMPLES = 50000  # surface samples of the raster estimator, large faces get several samples
+SUPPORT_FACE_SAMPLES = 16  # maximal samples per face
+
+# Progress in percent at the end of each stage of the Tweak, the scoring advances with its chunks in between
+PROGRESS = {"preprocess": 10, "area_cumulation": 20, "candidates": 30, "scoring": 85, "local_search": 90,
+            "refine": 95, "total": 100}
+
+# The footprint of an orientation is the smallest rectangle around the mesh seen from above, its sides are searched
+# in FOOTPRINT_ANGLES directions over a half turn (an even amount, so the normal of each direction is searched too)
+FOOTPRINT_ANGLES = 36
+# Before, the vertices are reduced to the farthest vertex from the centre in each cell of a latitude/longitude grid
+# with FOOTPRINT_CELLS rows, the removed vertices are hidden behind the kept ones (up to the angle of a cell)
+FOOTPRINT_CELLS = 128
+
+# Orientations closer than this angle (in degrees) are merged
+DUPLICATE_ANGLE = 5
+
+# Amount of the best orientations of a decimated mesh that are scored again on the full mesh
+REFINE_COUNT = 5
+
+# The local search starts from the best orientations and tilts them by a step angle into LOCAL_SEARCH_DIRECTIONS
+# directions, the step is halved whenever no direction improves, until it falls below the minimal step.
+LOCAL_SEARCH_STARTS = 3
+LOCAL_SEARCH_DIRECTIONS = 6
+LOCAL_SEARCH_STEP = np.radians(8)
+LOCAL_SEARCH_MIN_STEP = np.radians(0.5)
+
+
+class TweakCancelled(Exception):
+    """Raised by a Tweak whose cancel_callback returned True."""
+
+
+class Mesh:
+    """ The preprocessed mesh of the Tweaker, stored as a structure of arrays.
+
+    Each field is a contiguous array, so the reductions over all faces run on contiguous memory:
+    .normals (face_count x 3) unit normals of the faces,
+    .vertices (3 x face_count x 3) the vertices v0, v1 and v2 of each face,
+    .areas (face_count) the area of each face,
+    .indices (face_count x 3) the vertex indices of each face, if the mesh was indexed, otherwise None.
+    The edge adjacency of the faces is built on the first call of edge_index and reused for all orientations.
+    """
+
+    def __init__(self, normals, vertices, areas, indices=None):
+        self.normals = np.ascontiguousarray(normals)
+        self.vertices = np.ascontiguousarray(vertices)
+        self.areas = np.ascontiguousarray(areas)
+        self.indices = indices
+        self._edge_index = None
+        self._surface_samples = None
+
+    def __len__(self):
+        return len(self.areas)
+
+    @property
+    def dtype(self):
+        return self.areas.dtype
+
+    @property
+    def nbytes(self):
+        return self.normals.nbytes + self.vertices.nbytes + self.areas.nbytes
+
+    def take(self, index):
+        """Returns a new mesh of the faces selected by a boolean mask or an index array."""
+        return Mesh(self.normals[index], self.vertices[:, index], self.areas[index],
+                    None if self.indices is None else self.indices[index])
+
+    @staticmethod
+    def concatenate(meshes):
+        """Returns a new mesh of the faces of several meshes, the vertex indices are dropped."""
+        return Mesh(np.concatenate([mesh.normals for mesh in meshes]),
+                    np.concatenate([mesh.vertices for mesh in meshes], axis=1),
+                    np.concatenate([mesh.areas for mesh in meshes]))
+
+    def edge_index(self):
+        """Calculating the edges shared by the faces. The vertices of a mesh without indices are welded by their
+        exact coordinates.
+        Returns:
+            face_edges (np.array): face_count x 3 edge numbers, edge i of a face connects its vertex i and i+1
+            lengths (np.array): length of each edge
+        """
+        if self._edge_index is None:
+            if self.indices is not None:
+                vertex_ids = np.asarray(self.indices, dtype=np.int64)
+            else:
+                corners = self.vertices.reshape(-1, 3) + 0.0  # adding 0.0 maps -0.0 onto 0.0
+                keys = corners.view("i{}".format(corners.itemsize)).astype(np.int64, copy=False)
+                del corners
+                vertex_ids = Tweak.group_keys(keys)[1].reshape(3, -1).T
+                del keys
+            vertex_count = int(vertex_ids.max()) + 1 if len(vertex_ids) else 1
+            following = np.roll(vertex_ids, -1, axis=1)
+            # an edge is identified by its lower and higher vertex id
+            pairs = np.minimum(vertex_ids, following) * vertex_count + np.maximum(vertex_ids, following)
+            del following
+            _, first, inverse = np.unique(pairs.ravel(), return_index=True, return_inverse=True)
+            face, corner = np.divmod(first, 3)
+            lengths = np.linalg.norm(self.vertices[(corner + 1) % 3, face] - self.vertices[corner, face], axis=-1)
+            self._edge_index = inverse.reshape(-1, 3), lengths
+        return self._edge_index
+
+    def surface_samples(self):
+        """Sampling the surface with about SUPPORT_SAMPLES points, spread over the faces by their area with a
+        low discrepancy sequence. The samples are built on the first call and reused for all orientations.
+        Returns:
+            faces (np.array): face of each sample
+            points (np.array): samples with format sample_count x 3
+            weights (np.array): area represented by each sample
+        """
+        if self._surface_samples is None:
+            areas = self.areas.astype(np.float64)
+            faces = np.arange(len(areas))
+            stride = max(1, int(np.ceil(len(areas) / SUPPORT_SAMPLES)))
+            if stride > 1:  # more faces than samples, every stride-th face represents its neighbours
+                faces = faces[::stride]
+                counts = np.ones(len(faces), dtype=np.int64)
+            else:
+                target = max(np.sum(areas) / SUPPORT_SAMPLES, 1e-12)
+                counts = np.clip(np.ceil(areas / target), 1, SUPPORT_FACE_SAMPLES).astype(np.int64)
+            sample_faces = np.repeat(faces, counts)
+            number = np.arange(len(sample_faces)) - np.repeat(np.cumsum(counts) - counts, counts)
+            # R2 sequence in the unit square, reflected into the triangle, a single sample is the centroid
+            a = (0.5 + (number + 1)[:, None] * np.array([0.7548776662466927, 0.5698402909980532])) % 1
+            a = np.where(a.sum(axis=1, keepdims=True) > 1, 1 - a, a)
+            a[np.repeat(counts == 1, counts)] = 1 / 3
+            v0, v1, v2 = [vertex[sample_faces].astype(np.float64) for vertex in self.vertices]
+            points = v0 + a[:, :1] * (v1 - v0) + a[:, 1:] * (v2 - v0)
+            weights = areas[sample_faces] / np.repeat(counts, counts) * stride
+            self._surface_samples = sample_faces, points, weights
+        return self._surface_samples
+
+    def boundary_lengths(self, regions):
+        """Calculating the length of the boundary of face regions, that are the edges of exactly one face of a
+        region. Edges shared by two faces of the region are inner edges and not counted.
+        Args:
+            regions (np.array): boolean mask with format n x face_count
+        Returns:
+            boundary length of each of the n regions
+        """
+        face_edges, lengths = self.edge_index()
+        region, face = np.nonzero(regions)
+        keys, counts = np.unique((region[:, None] * len(lengths) + face_edges[face]).ravel(), return_counts=True)
+        boundary = keys[counts == 1]
+        return np.bincount(boundary // len(lengths), weights=lengths[boundary % len(lengths)], minlength=len(regions))
+
 
 class Tweak:
     """ The Tweaker is an auto rotate class for 3D objects.
@@ -73,47 +284,85 @@ class Tweak:
     """
 
     def __init__(self, content, extended_mode=False, verbose=True, show_progress=False,
-                 favside=None, min_volume=False, parameter=None,  progress_callback=None):
+                 favside=None, min_volume=False, parameter=None,  progress_callback=None,
+                 memory_budget=MEMORY_BUDGET, normal_tolerance=0, candidate_generator="death_star",
+                 max_faces=None, dtype=np.float64, stats_callback=None, indices=None, transformation=None,
+                 local_search=0, keep_mesh=False, support_estimator="centroid", cancel_callback=None,
+                 footprints=0):
         # Load parameters
-        if parameter is None:
-            if min_volume:
-                parameter = PARAMETER_VOL
-            else:
-                parameter = PARAMETER
-
-        for k, v in parameter.items():
-            setattr(self, k, v)
-
-        if abs(self.OV_H - 2) < 0.1:  # set to nearby integers as they are faster
-            self.OV_H = 2
-        if abs(self.OV_H - 1) < 0.1:
-            self.OV_H = 1
+        self.load_parameter(parameter, min_volume)
+        if support_estimator not in SUPPORT_ESTIMATORS:
+            raise ValueError("Unknown support estimator: {}".format(support_estimator))
+        self.support_estimator = support_estimator
 
         self.progress_callback = progress_callback
+        self.cancel_callback = cancel_callback  # checked between the stages and the chunks, raises TweakCancelled
+        self.stats_callback = stats_callback
         self.extended_mode = extended_mode
+        self.memory_budget = memory_budget
+        self.normal_tolerance = normal_tolerance
+        self.dtype = np.dtype(dtype)  # np.float32 halves the memory of the mesh
+        if candidate_generator not in CANDIDATE_GENERATORS:
+            raise ValueError("Unknown candidate generator: {}".format(candidate_generator))
+        self.candidate_generator = candidate_generator
         self.show_progress = show_progress
         z_axis = -np.array([0, 0, 1], dtype=np.float64)
         orientations = [[z_axis, 0.0]]
 
         # Preprocess the input mesh format.
         t_start = time()
+        self.stats = dict()  # durations of the stages in seconds and the sizes of the mesh and candidate sets
         self._progress = 0  # progress in percent of tweaking
-        self.update_progress(self._progress + 18)
-        # Load mesh from file into class variable
-        self.mesh = self.preprocess(content)
+        self.update_progress(0)
+        self.area_totals = None  # summed areas of parallel faces, if they were summed while preprocessing
+        # Meshes with more than max_faces faces are searched on a decimated mesh and refined on the full mesh
+        full_content = None
+        self.decimation_error = None
+        self.filter_negligible = None
+        if isinstance(content, Iterator):
+            # a stream of vertex chunks is read once, only the faces that are kept are stored
+            if max_faces or indices is not None:
+                raise ValueError("A stream of vertex chunks can't be decimated or indexed")
+            self.mesh, faces_input = self.preprocess_stream(content, transformation=transformation)
+        else:
+            faces_input = self.count_faces(content) if indices is None else len(indices)
+            if max_faces and faces_input > max_faces:
+                # the decimation and the refinement work on the plain vertex list
+                full_content = self.triangles(content, indices, transformation)
+                indices = transformation = None
+                # decided once on the full mesh, as the decimation merges the negligible faces into large ones
+                self.filter_negligible = self.negligible_filter(full_content)
+                content = self.decimate(full_content, max_faces, filter_negligible=self.filter_negligible)
+            # Load mesh from file into class variable, a decimated mesh has no negligible faces left to remove
+            self.mesh = self.preprocess(content, filter_negligible=False if full_content is not None else None,
+                                        indices=indices, transformation=transformation)
 
         # if a favoured side is specified, load it to weight
         if favside:
             self.favour_side(favside)
         t_pre = time()
-        self.update_progress(self._progress + 18)
+        self.record_stage("preprocess", t_pre - t_start, faces_input=faces_input,
+                          faces_decimated=self.count_faces(content) if full_content is not None else None,
+                          faces=len(self.mesh))
+        self.update_progress(PROGRESS["preprocess"])
         # Searching promising orientations:
         orientations += self.area_cumulation(10)
 
         t_areacum = time()
-        self.update_progress(self._progress + 18)
-        if extended_mode:
-            orientations += self.death_star(12)
+        self.record_stage("area_cumulation", t_areacum - t_pre, orientations_area_cumulation=len(orientations) - 1)
+        self.update_progress(PROGRESS["area_cumulation"])
+        orientations_generated = 0
+        if extended_mode and self.candidate_generator == "stable_poses":
+            generated = self.stable_poses(STABLE_POSES, orientations[1:])
+            orientations_generated = len(generated)
+            orientations = self.remove_duplicates(orientations[:1] + generated)
+        elif extended_mode:
+            if self.candidate_generator == "sphere_histogram":
+                generated = self.sphere_histogram(12)
+            else:
+                generated = self.death_star(12)
+            orientations_generated = len(generated)
+            orientations += generated
             orientations += self.add_supplements()
             orientations = self.remove_duplicates(orientations)
 
@@ -123,28 +372,44 @@ class Tweak:
                   ("Alignment:", "Bottom:", "Overhang:", "Contour:", "Unpr.:"))
 
         t_ds = time()
-        self.update_progress(self._progress + 18)
+        self.record_stage("candidates", t_ds - t_areacum, orientations_generated=orientations_generated,
+                          orientations=len(orientations))
+        self.update_progress(PROGRESS["candidates"])
         # Calculate the unprintability for each orientation found in the gathering algorithms
-        results = list()
-        for side in orientations:
-            orientation = -1 * np.array(side[0], dtype=np.float64)
-
-            self.project_vertices(orientation)
-            bottom, overhang, contour = self.calc_overhang(orientation, min_volume=min_volume)
-            unprintability = self.target_function(bottom, overhang, contour, min_volume=min_volume)
-            results.append([orientation, bottom, overhang, contour, unprintability])
+        results = self.score_orientations(orientations, min_volume=min_volume,
+                                          progress=(PROGRESS["candidates"], PROGRESS["scoring"]))
+        t_score = time()
+        self.record_stage("scoring", t_score - t_ds, scoring_per_orientation=(t_score - t_ds) / len(orientations))
+        if local_search > 0:
+            # improve the best orientations of the (decimated) mesh, at most local_search orientations are scored
+            results += self.local_search(results, local_search, min_volume=min_volume)
+            t_local = time()
+            self.record_stage("local_search", t_local - t_score, local_search_evaluations=self.local_evaluations)
+            self.update_progress(PROGRESS["local_search"])
+            t_score = t_local
+        if full_content is not None:
+            results = self.refine(full_content, results, min_volume=min_volume)
+            self.record_stage("refine", time() - t_score, decimation_error=float(self.decimation_error))
+            self.update_progress(PROGRESS["refine"])
             if verbose:
+                print("Decimated to {} faces, relative error of the best unprintability: {:.4g}".format(
+                    self.count_faces(content), self.decimation_error))
+        if verbose:
+            for orientation, bottom, overhang, contour, unprintability in results:
                 print("  %-26s %-10.2f%-10.2f%-10.2f%-10.4g "
                       % (str(np.around(orientation, decimals=4)),
                          bottom, overhang, contour, unprintability))
         t_lit = time()
-        self.update_progress(self._progress + 18)
 
-        # Remove the mesh structure as soon as it is not used anymore
-        del self.mesh
+        # Support volume of the best orientation, measured on the (decimated) mesh
+        self.support_volume = None
+        if min_volume and self.support_estimator == "raster" and len(results) > 0:
+            best = min(results, key=lambda result: result[4])
+            side = np.asarray(best[0], dtype=np.float64).reshape(1, 3)
+            self.support_volume = float(self.raster_support(self.mesh, side)[1][0])
 
         # evaluate the best alignments and calculate the rotation parameters
-        results = np.array(results)
+        results = np.array(results, dtype=object)
         best_results = list(results[results[:, 4].argsort()])  # [:5]]  # previously, the best 5 alignments were stored
 
         for i, align in enumerate(best_results):
@@ -152,6 +417,19 @@ class Tweak:
             v, phi, matrix = self.euler(align)
             best_results[i].append([[v[0], v[1], v[2]], phi, matrix])
 
+        # Footprint on the build plate of the first best alignments, to pack a whole build plate
+        self.footprints = None
+        if footprints > 0 and len(best_results) > 0:
+            self.footprints = self.footprint_areas(
+                np.array([align[0] for align in best_results[:footprints]], dtype=np.float64))
+
+        # Remove the mesh structure as soon as it is not used anymore, unless single orientations are scored later
+        if not keep_mesh:
+            del self.mesh
+
+        self.record_stage("total", t_lit - t_start)
+        self.update_progress(PROGRESS["total"])
+
         if verbose:
             print("""Time-stats of algorithm:
     Preprocessing:    \t{pre:2f} s
@@ -180,6 +458,53 @@ class Tweak:
         if show_progress:
             print("\n")
 
+    def load_parameter(self, parameter, min_volume):
+        """Copying the compiled parameter set (the default set of the mode if None) onto the instance."""
+        if parameter is None:
+            if min_volume:
+                parameter = PARAMETER_VOL
+            else:
+                parameter = PARAMETER
+
+        self.__dict__.update(compile_parameter(parameter))
+        self.min_volume = min_volume
+
+    def score(self, alignment):
+        """Scoring a single orientation of the kept mesh (see keep_mesh and OrientationAnalyzer).
+        Args:
+            alignment (np.array): direction of the mesh that points upwards, as .alignment of the results
+        Returns:
+            [orientation, bottom, overhang, contour, unprintability]
+        """
+        side = np.asarray(alignment, dtype=np.float64)
+        return self.score_orientations([[-side / np.linalg.norm(side), 0]], self.min_volume)[0]
+
+    def score_neighbourhood(self, alignment, angle=np.radians(5), directions=8):
+        """Scoring an orientation and its neighbours tilted by an angle into several directions at once.
+        Args:
+            alignment (np.array): direction of the mesh that points upwards, as .alignment of the results
+            angle (float): tilt of the neighbours in rad
+            directions (int): amount of neighbours
+        Returns:
+            list of [orientation, bottom, overhang, contour, unprintability], the orientation itself first
+        """
+        side = np.asarray(alignment, dtype=np.float64)
+        side = side / np.linalg.norm(side)
+        sides = np.concatenate([side[None, :], self.tilt(side, angle, directions)])
+        return self.score_orientations([[-side, 0] for side in sides], self.min_volume)
+
+    @staticmethod
+    def tilt(side, angle, directions):
+        """Returns the unit vectors tilted by an angle from side into evenly spread directions."""
+        # orthonormal tangent vectors of the side
+        helper = np.eye(3)[np.argmin(np.abs(side))]
+        u = np.cross(side, helper)
+        u /= np.linalg.norm(u)
+        w = np.cross(side, u)
+        angles = np.arange(directions) * 2 * np.pi / directions
+        tilts = np.cos(angle) * side + np.sin(angle) * (np.outer(np.cos(angles), u) + np.outer(np.sin(angles), w))
+        return tilts / np.linalg.norm(tilts, axis=1, keepdims=True)
+
     def target_function(self, bottom, overhang, contour, min_volume):
         """This function returns the Unprintability for a given set of bottom
         overhang area and bottom contour length, based on an ordinal scale.
@@ -198,59 +523,112 @@ class Tweak:
             return (self.TAR_A * (overhang + self.TAR_B) + self.RELATIVE_F *
                     (overhang + self.TAR_C) / (self.TAR_D + self.CONTOUR_F * contour + self.BOTTOM_F * bottom))
 
-    def preprocess(self, content):
+    def preprocess(self, content, filter_negligible=None, indices=None, transformation=None):
         """The Mesh format gets preprocessed for a better performance and stored into self.mesh
         Args:
-            content (np.array): undefined representation of the mesh
-        Returns:
-            mesh (np.array): with format face_count x 6 x 3.
-        """
-        mesh = np.array(content, dtype=np.float64)
-
-        # prefix area vector, if not already done (e.g. in STL format)
-        if mesh.shape[1] == 3:
-            row_number = int(len(content) / 3)
-            mesh = mesh.reshape(row_number, 3, 3)
-            v0 = mesh[:, 0, :]
-            v1 = mesh[:, 1, :]
-            v2 = mesh[:, 2, :]
-            normals = np.cross(np.subtract(v1, v0), np.subtract(v2, v0)) \
-                .reshape(row_number, 1, 3)
-            mesh = np.hstack((normals, mesh))
-
-        # saves the amount of facets
-        face_count = mesh.shape[0]
-
-        # append columns with a_min, area_size
-        addendum = np.zeros((face_count, 2, 3))
-        addendum[:, 0, 0] = mesh[:, 1, 2]
-        addendum[:, 0, 1] = mesh[:, 2, 2]
-        addendum[:, 0, 2] = mesh[:, 3, 2]
-
-        # calc area size
-        addendum[:, 1, 0] = np.sqrt(np.sum(np.square(mesh[:, 0, :]), axis=-1)).reshape(face_count)
-        addendum[:, 1, 1] = np.max(mesh[:, 1:4, 2], axis=1)
-        addendum[:, 1, 2] = np.median(mesh[:, 1:4, 2], axis=1)
-        mesh = np.hstack((mesh, addendum))
-
-        # filter faces without area
-        mesh = mesh[mesh[:, 5, 0] != 0]
-        face_count = mesh.shape[0]
+            content (np.array): undefined representation of the mesh, or the vertices of an indexed mesh
+            filter_negligible (bool): remove faces smaller than NEGL_FACE_SIZE, if None only when more than
+                100 faces remain
+            indices (np.array): face_count x 3 vertex indices of an indexed mesh, e.g. of Cura's MeshData
+            transformation (np.array): 4 x 4 transformation applied to the vertices, e.g. the world
+                transformation of a node, so the mesh doesn't need to be transformed and copied beforehand
+        Returns:
+            mesh (Mesh): structure of arrays with the normals, vertices and areas of the faces.
+        """
+        if indices is None and transformation is None:
+            mesh = np.array(content, dtype=self.dtype)
+
+            # calculate the area vector, if not already done (e.g. in STL format)
+            if mesh.shape[1] == 3:
+                row_number = int(len(content) / 3)
+                vertices = mesh.reshape(row_number, 3, 3)
+                normals = np.cross(np.subtract(vertices[:, 1, :], vertices[:, 0, :]),
+                                   np.subtract(vertices[:, 2, :], vertices[:, 0, :]))
+            else:
+                normals = mesh[:, 0, :]
+                vertices = mesh[:, 1:4, :]
+            vertices = vertices.transpose(1, 0, 2)
+            del mesh
+        else:
+            points = self.transform(content, transformation, self.dtype)
+            if indices is None:
+                vertices = points.reshape(-1, 3, 3).transpose(1, 0, 2)
+            else:
+                # gather the vertices of the faces directly into the 3 x face_count x 3 layout of the Mesh
+                indices = np.asarray(indices)
+                vertices = np.empty((3, len(indices), 3), dtype=self.dtype)
+                for i in range(3):
+                    np.take(points, indices[:, i], axis=0, out=vertices[i])
+            del points
+            normals = np.cross(vertices[1] - vertices[0], vertices[2] - vertices[0])
+
+        # calc area size and filter faces without area
+        areas = np.sqrt(np.sum(np.square(normals), axis=-1))
+        faces = areas != 0
+        areas = areas[faces]
 
         # normalise area vector and correct area size
-        mesh[:, 0, :] = mesh[:, 0, :] / mesh[:, 5, 0].reshape(face_count, 1)
-        mesh[:, 5, 0] = mesh[:, 5, 0] / 2  # halve, because areas are triangles and not parallelograms
+        normals = normals[faces] / areas.reshape(-1, 1)
+        areas = areas / 2  # halve, because areas are triangles and not parallelograms
+        mesh = Mesh(normals, vertices[:, faces], areas, None if indices is None else indices[faces])
 
         # remove small facets (these are essential for contour calculation)
-        if self.NEGL_FACE_SIZE > 0:
-            negl_size = [0.1 * x if self.extended_mode else x for x in [self.NEGL_FACE_SIZE]][0]
-            filtered_mesh = mesh[np.where(mesh[:, 5, 0] > negl_size)]
-            if len(filtered_mesh) > 100:
-                mesh = filtered_mesh
+        if self.NEGL_FACE_SIZE > 0 and filter_negligible is not False:
+            negl_size = self.NEGL_FACE_SIZE_EXTENDED if self.extended_mode else self.NEGL_FACE_SIZE
+            large = mesh.areas > negl_size
+            if np.sum(large) > 100 or filter_negligible:
+                mesh = mesh.take(large)
 
         sleep(0)  # Yield, so other threads get a bit of breathing space.
         return mesh
 
+    def preprocess_stream(self, chunks, transformation=None):
+        """Preprocessing a mesh that is read in chunks, e.g. from a memory mapped STL file, so the whole input is
+        never held in memory. Each chunk is preprocessed on its own and only the faces that preprocess would keep are
+        stored. The areas of parallel faces are summed on the way into self.area_totals for area_cumulation.
+        Args:
+            chunks (iterator): vertex arrays with format (chunk_face_count * 3) x 3, or chunk_face_count x 4 x 3
+                with the normals, as for preprocess
+            transformation (np.array): 4 x 4 transformation applied to the vertices
+        Returns:
+            mesh (Mesh) of the kept faces and the amount of faces read
+        """
+        negl_size = self.NEGL_FACE_SIZE_EXTENDED if self.extended_mode else self.NEGL_FACE_SIZE
+        # as in preprocess, the negligible faces are only removed if more than 100 large faces remain, the chunks
+        # are held back until this is decided (usually after the first chunk)
+        filtering = None if self.NEGL_FACE_SIZE > 0 else False
+        faces_read = large_faces = 0
+        meshes, totals, pending = list(), list(), list()
+
+        def keep(kept):
+            if len(kept) == 0:
+                return
+            keys, first, areas, sums = self.area_groups(kept.normals, kept.areas)
+            totals.append((keys, first + sum(len(mesh) for mesh in meshes), areas, sums))
+            meshes.append(kept)
+
+        for chunk in chunks:
+            faces_read += self.count_faces(chunk)
+            mesh = self.preprocess(chunk, filter_negligible=False, transformation=transformation)
+            if filtering is None:
+                pending.append(mesh)
+                large_faces += np.sum(mesh.areas > negl_size)
+                if large_faces > 100:
+                    filtering = True
+                    for mesh in pending:
+                        keep(mesh.take(mesh.areas > negl_size))
+                    pending = list()
+            else:
+                keep(mesh.take(mesh.areas > negl_size) if filtering else mesh)
+            self.check_cancelled()
+        for mesh in pending:  # too few large faces to remove the small ones
+            keep(mesh)
+
+        if not meshes:
+            return self.preprocess(np.zeros((0, 3))), faces_read
+        self.area_totals = self.merge_area_groups(totals)
+        return (Mesh.concatenate(meshes) if len(meshes) > 1 else meshes[0]), faces_read
+
     def favour_side(self, favside):
         """This function weights the size of orientations closer than 45 deg
         to a favoured side higher.
@@ -277,32 +655,107 @@ class Tweak:
         print("You favour the side {} with a factor of {}".format(side, f))
 
         # Filter the aligning orientations
-        diff = np.subtract(self.mesh[:, 0, :], side)
+        diff = np.subtract(self.mesh.normals, side)
         align = np.sum(diff * diff, axis=1) < self.ANGLE_SCALE  # 0.7654, ANGLE_SCALE ist around 0.1
-        mesh_not_align = self.mesh[np.logical_not(align)]
-        mesh_align = self.mesh[align]
-        mesh_align[:, 5, 0] = f * mesh_align[:, 5, 0]  # weight aligning orientations
-
-        self.mesh = np.concatenate((mesh_not_align, mesh_align), axis=0)
+        self.mesh = self.mesh.take(np.concatenate((np.flatnonzero(np.logical_not(align)), np.flatnonzero(align))))
+        self.mesh.areas[len(self.mesh) - np.sum(align):] *= f  # weight aligning orientations
+        self.area_totals = None  # the faces were reordered and weighted
 
     def area_cumulation(self, best_n):
         """
         Gathering promising alignments by the accumulation of
         the magnitude of parallel area vectors.
+        The normals are hashed to integer keys and the areas are summed per key, see area_groups. The sums of a
+        streamed mesh were already collected while preprocessing.
         Args:
             best_n (int): amount of orientations to return.
         Returns:
             list of the common orientation-tuples.
         """
-        alignments = self.mesh[:, 0, :]
-        orient = Counter()
-        for index in range(len(self.mesh)):  # Accumulate area-vectors
-            orient[tuple(alignments[index])] += self.mesh[index, 5, 0]
+        if self.area_totals is not None:
+            _, first, areas, sums = self.area_totals
+        else:
+            _, first, areas, sums = self.area_groups(self.mesh.normals, self.mesh.areas)
+
+        # sort by area and resolve ties by the first occurrence, like Counter.most_common
+        candidates = np.arange(len(areas))
+        if len(areas) > best_n > 0:
+            candidates = np.flatnonzero(areas >= np.partition(areas, len(areas) - best_n)[len(areas) - best_n])
+        top = candidates[np.lexsort((first[candidates], -areas[candidates]))][:best_n]
+        if self.normal_tolerance > 0:
+            normals = sums[top] / np.linalg.norm(sums[top], axis=1).reshape(-1, 1)
+        else:
+            normals = self.mesh.normals[first[top]].astype(np.float64)
 
-        top_n = orient.most_common(best_n)
+        top_n = [(tuple(normal), area) for normal, area in zip(normals, areas[top])]
         sleep(0)  # Yield, so other threads get a bit of breathing space.
         return top_n
 
+    def area_groups(self, normals, areas):
+        """Summing the areas of parallel faces. With a normal_tolerance of 0 only identical normals are merged,
+        otherwise the normal components are quantized to this grid spacing.
+        Args:
+            normals (np.array): unit normals of the faces
+            areas (np.array): areas of the faces
+        Returns:
+            key, index of the first face, summed area and (with a normal_tolerance) area weighted normal sum
+            of each group
+        """
+        if self.normal_tolerance > 0:
+            keys = np.round(normals / self.normal_tolerance).astype(np.int64)
+        else:
+            # the bit patterns of the floats, adding 0.0 maps -0.0 onto 0.0, as tuple keys do
+            keys = (normals + 0.0).view("i{}".format(normals.itemsize)).astype(np.int64, copy=False)
+        first, inverse = self.group_keys(keys)
+        sums = None
+        if self.normal_tolerance > 0:
+            sums = np.stack([np.bincount(inverse, weights=normals[:, i] * areas, minlength=len(first))
+                             for i in range(3)], axis=1)
+        return keys[first], first, np.bincount(inverse, weights=areas, minlength=len(first)), sums
+
+    def merge_area_groups(self, groups):
+        """Merging the area_groups of consecutive parts of a mesh, the first face indices must already be
+        offset by the faces of the previous parts.
+        Returns:
+            the area groups of the whole mesh
+        """
+        keys = np.concatenate([group[0] for group in groups])
+        first, inverse = self.group_keys(keys)
+        areas = np.bincount(inverse, weights=np.concatenate([group[2] for group in groups]), minlength=len(first))
+        sums = None
+        if self.normal_tolerance > 0:
+            sums = np.concatenate([group[3] for group in groups])
+            sums = np.stack([np.bincount(inverse, weights=sums[:, i], minlength=len(first)) for i in range(3)],
+                            axis=1)
+        # the parts are in order, so the first occurrence of a key is in the earliest part
+        return keys[first], np.concatenate([group[1] for group in groups])[first], areas, sums
+
+    @staticmethod
+    def group_keys(keys):
+        """Grouping equal rows of integer keys by sorting a 64 bit hash of the rows.
+        Args:
+            keys (np.array): integer keys with format n x 3
+        Returns:
+            index of the first occurrence of each group, group index of each row
+        """
+        hashes = keys[:, 0] * np.int64(-7046029254386353131) + keys[:, 1] * np.int64(3141592653589793) + keys[:, 2]
+        order = np.argsort(hashes, kind="stable")
+        sorted_hashes = hashes[order]
+        new_group = sorted_hashes[1:] != sorted_hashes[:-1]
+        # compare the keys of neighbours with equal hashes column by column, to keep the scratch memory small
+        same = np.flatnonzero(~new_group)
+        if any(np.any(keys[order[same], i] != keys[order[same + 1], i]) for i in range(keys.shape[1])):
+            # hash collision, fall back to the exact (but slower) row-wise unique
+            _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+            return first, inverse.reshape(-1)
+
+        group = np.concatenate(([0], np.cumsum(new_group)))
+        inverse = np.empty(len(keys), dtype=np.int64)
+        inverse[order] = group
+        # the sort is stable, so the first row of each group is its first occurrence
+        first = order[np.concatenate(([0], np.flatnonzero(new_group) + 1))]
+        return first, inverse
+
     def death_star(self, best_n):
         """
         Creating random faces by adding a random vertex to an existing edge.
@@ -318,16 +771,16 @@ class Tweak:
         mesh_len = len(self.mesh)
         iterations = int(np.ceil(20000 / (mesh_len + 100)))
 
-        vertexes = self.mesh[:mesh_len, 1:4, :]
+        vertexes = self.mesh.vertices
         tot_normalized_orientations = np.zeros((iterations * mesh_len + 1, 3))
         for i in range(iterations):
-            two_vertexes = vertexes[:, np.random.choice(3, 2, replace=False)]
-            vertex_0 = two_vertexes[:, 0, :]
-            vertex_1 = two_vertexes[:, 1, :]
+            two_vertexes = np.random.choice(3, 2, replace=False)
+            vertex_0 = vertexes[two_vertexes[0]]
+            vertex_1 = vertexes[two_vertexes[1]]
 
             # Using a linear congruency generator instead to choice pseudo
             # random vertexes. Adding i to get more iterations.
-            vertex_2 = vertexes[(np.arange(mesh_len) * 127 + 8191 + i) % mesh_len, i % 3, :]
+            vertex_2 = vertexes[i % 3][(np.arange(mesh_len) * 127 + 8191 + i) % mesh_len]
             normals = np.cross(np.subtract(vertex_2, vertex_0),
                                np.subtract(vertex_1, vertex_0))
 
@@ -340,6 +793,7 @@ class Tweak:
 
             tot_normalized_orientations[mesh_len * i:mesh_len * (i + 1)] = normalized_orientations
             sleep(0)  # Yield, so other threads get a bit of breathing space.
+            self.check_cancelled()
 
         # search the most common orientations
         orientations = np.inner(np.array([1, 1e3, 1e6]), tot_normalized_orientations)
@@ -358,6 +812,160 @@ class Tweak:
         candidate += [[list((-v[0][0], -v[0][1], -v[0][2])), v[1]] for v in candidate]
         return candidate
 
+    def sphere_histogram(self, best_n):
+        """
+        Binning the area weighted face normals and the normals of synthesized faces (spanned by an edge and a
+        vertex of another face, as in the death star) into a fixed icosphere grid. The local maxima of the histogram
+        are promising orientations. In contrast to the death star, the result is deterministic and the memory is
+        bounded by the size of the grid.
+        Args:
+            best_n (int): amount of orientations to return.
+        Returns:
+            list of the common orientation-tuples.
+        """
+        centers, neighbours, lookup = self.icosphere(ICOSPHERE_LEVEL)
+        cell_count = len(centers)
+        weights = np.zeros(cell_count)
+        sums = np.zeros((cell_count, 3))
+
+        def accumulate(normals, weight):
+            cells = self.sphere_cell(normals, lookup)
+            weights[:] += np.bincount(cells, weights=weight, minlength=cell_count)
+            for k in range(3):
+                sums[:, k] += np.bincount(cells, weights=weight * normals[:, k], minlength=cell_count)
+
+        areas = self.mesh.areas
+        accumulate(self.mesh.normals, areas)
+
+        # Small files need more calculations, each synthesized face counts like a face of average size
+        mesh_len = len(self.mesh)
+        iterations = int(np.ceil(20000 / (mesh_len + 100)))
+        vertexes = self.mesh.vertices
+        for i in range(iterations):
+            vertex_0 = vertexes[i % 3]
+            vertex_1 = vertexes[(i + 1) % 3]
+            vertex_2 = vertexes[(i + 2) % 3][(np.arange(mesh_len) * 127 + 8191 + i) % mesh_len]
+            normals = np.cross(np.subtract(vertex_2, vertex_0), np.subtract(vertex_1, vertex_0))
+            lengths = np.sqrt((normals * normals).sum(axis=1))
+            normals = normals[lengths > 0] / lengths[lengths > 0].reshape(-1, 1)
+            # the sign of a synthesized face is arbitrary, count both sides
+            weight = np.full(len(normals), np.mean(areas))
+            accumulate(normals, weight)
+            accumulate(-normals, weight)
+            sleep(0)  # Yield, so other threads get a bit of breathing space.
+            self.check_cancelled()
+
+        # local maxima are at least as high as all neighbours, plateaus are resolved by the lowest cell index
+        padded = np.append(weights, -1)  # neighbours are padded with the index cell_count
+        index = np.arange(cell_count).reshape(-1, 1)
+        maxima = np.all((weights.reshape(-1, 1) > padded[neighbours]) |
+                        ((weights.reshape(-1, 1) == padded[neighbours]) & (index < neighbours)), axis=1)
+        maxima = np.flatnonzero(maxima & (weights > 0))
+        maxima = maxima[np.argsort(-weights[maxima], kind="stable")][:best_n]
+
+        directions = sums[maxima] / np.linalg.norm(sums[maxima], axis=1).reshape(-1, 1)
+        candidate = [[list(direction), weights[cell]] for direction, cell in zip(directions, maxima)]
+        # also add anti-parallel orientations
+        candidate += [[list((-v[0][0], -v[0][1], -v[0][2])), v[1]] for v in candidate]
+        return candidate
+
+    @staticmethod
+    def icosphere(level):
+        """Creating an icosphere grid by subdividing an icosahedron, the grid is cached per level.
+        Args:
+            level (int): amount of subdivisions
+        Returns:
+            cell centers (n x 3), neighbour indices (n x 6, padded with n) and a lookup table from a
+            polar/azimuth grid to the nearest cell.
+        """
+        if level in _ICOSPHERES:
+            return _ICOSPHERES[level]
+
+        t = (1 + np.sqrt(5)) / 2
+        vertices = np.array([[-1, t, 0], [1, t, 0], [-1, -t, 0], [1, -t, 0], [0, -1, t], [0, 1, t],
+                             [0, -1, -t], [0, 1, -t], [t, 0, -1], [t, 0, 1], [-t, 0, -1], [-t, 0, 1]],
+                            dtype=np.float64)
+        faces = np.array([[0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11], [1, 5, 9], [5, 11, 4],
+                          [11, 10, 2], [10, 7, 6], [7, 1, 8], [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8],
+                          [3, 8, 9], [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1]])
+        vertices /= np.linalg.norm(vertices, axis=1).reshape(-1, 1)
+        for _ in range(level):
+            # split each face into four by adding the (shared) edge midpoints
+            edges = np.sort(np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]]), axis=1)
+            unique_edges, edge_index = np.unique(edges, axis=0, return_inverse=True)
+            edge_index = edge_index.reshape(3, -1) + len(vertices)
+            midpoints = vertices[unique_edges].sum(axis=1)
+            vertices = np.vstack((vertices, midpoints / np.linalg.norm(midpoints, axis=1).reshape(-1, 1)))
+            a, b, c = faces.T
+            ab, bc, ca = edge_index
+            faces = np.concatenate([np.stack(f, axis=1) for f in
+                                    ([a, ab, ca], [b, bc, ab], [c, ca, bc], [ab, bc, ca])])
+
+        cell_count = len(vertices)
+        edges = np.unique(np.sort(np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]]), axis=1),
+                          axis=0)
+        edges = np.concatenate([edges, edges[:, ::-1]])
+        edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+        neighbours = np.full((cell_count, 6), cell_count, dtype=np.int64)
+        starts = np.searchsorted(edges[:, 0], np.arange(cell_count))
+        slot = np.arange(len(edges)) - starts[edges[:, 0]]
+        neighbours[edges[:, 0], slot] = edges[:, 1]
+
+        # lookup table with a resolution of about a quarter of the cell spacing
+        rows = int(4 * np.pi / np.arccos(np.clip(np.dot(vertices[edges[0, 0]], vertices[edges[0, 1]]), -1, 1)))
+        polar = (np.arange(rows) + 0.5) * np.pi / rows
+        azimuth = (np.arange(2 * rows) + 0.5) * np.pi / rows - np.pi
+        polar, azimuth = np.meshgrid(polar, azimuth, indexing="ij")
+        directions = np.stack([np.sin(polar) * np.cos(azimuth), np.sin(polar) * np.sin(azimuth), np.cos(polar)],
+                              axis=-1).reshape(-1, 3)
+        lookup = np.argmax(np.dot(directions.astype(np.float32), vertices.T.astype(np.float32)), axis=1)
+        lookup = lookup.reshape(rows, 2 * rows)
+
+        _ICOSPHERES[level] = vertices, neighbours, lookup
+        return _ICOSPHERES[level]
+
+    @staticmethod
+    def sphere_cell(normals, lookup):
+        """Finding the icosphere cell of unit vectors via the polar/azimuth lookup table.
+        Args:
+            normals (np.array): unit vectors with format n x 3
+            lookup (np.array): lookup table of the icosphere
+        Returns:
+            cell index of each vector
+        """
+        rows = lookup.shape[0]
+        polar = np.arccos(np.clip(normals[:, 2], -1, 1))
+        azimuth = np.arctan2(normals[:, 1], normals[:, 0])
+        row = np.minimum((polar * rows / np.pi).astype(np.int64), rows - 1)
+        column = np.minimum(((azimuth + np.pi) * rows / np.pi).astype(np.int64), 2 * rows - 1)
+        return lookup[row, column]
+
+    def stable_poses(self, best_n, candidates=()):
+        """
+        Selecting the orientations the part can rest on: the planes of the convex hull of the mesh whose support
+        polygon contains the projection of the centre of mass. If the hull is flat, the candidates and the
+        supplements are returned instead.
+        Args:
+            best_n (int): amount of stable planes to return, those of the largest support area.
+            candidates (list): orientation-tuples of the other stages, those parallel to a stable plane are kept.
+        Returns:
+            list of the stable orientation-tuples, the kept candidates first.
+        """
+        points, faces = convex_hull(self.mesh.vertices.reshape(-1, 3))
+        normals, areas = stable_planes(points, faces, center_of_mass(self.mesh.vertices))
+        sleep(0)  # Yield, so other threads get a bit of breathing space.
+        self.check_cancelled()
+        if len(normals) == 0:
+            return list(candidates) + self.add_supplements()
+
+        stable = list()
+        if len(candidates) > 0:
+            vectors = np.array([candidate[0] for candidate in candidates], dtype=np.float64).reshape(-1, 3)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            parallel = np.max(vectors @ normals.T, axis=1) > np.cos(np.radians(DUPLICATE_ANGLE))
+            stable = [candidate for candidate, keep in zip(candidates, parallel) if keep]
+        return stable + [[list(normal), area] for normal, area in zip(normals[:best_n], areas[:best_n])]
+
     @staticmethod
     def add_supplements():
         """Supplement 18 additional vectors.
@@ -373,117 +981,554 @@ class Tweak:
         return v
 
     @staticmethod
-    def remove_duplicates(old_orients):
-        """Removing duplicate and similar orientations.
+    def remove_duplicates(old_orients, alpha=DUPLICATE_ANGLE):
+        """Removing duplicate and similar orientations, that are closer than the angle alpha (see unique_indices).
         Args:
-            old_orients (list): list of faces
+            old_orients (list): list of orientation-tuples [[x, y, z], weight]
+            alpha (float): angle in degrees
         Returns:
             Unique orientations"""
-        alpha = 5  # in degrees
-        tol_angle = np.sin(alpha * np.pi / 180)
-        orientations = list()
-        for i in old_orients:
-            duplicate = None
-            for j in orientations:
-                # redundant vectors have an angle smaller than
-                # alpha = arcsin(atol). atol=0.087 -> alpha = 5 degrees
-                if np.allclose(i[0], j[0], atol=tol_angle):
-                    duplicate = True
-                    break
-            if duplicate is None:
-                orientations.append(i)
-        return orientations
-
-    def project_vertices(self, orientation):
-        """Supplement the mesh array with scalars (max and median)
-        for each face projected onto the orientation vector.
+        return [old_orients[i] for i in Tweak.unique_indices(old_orients, alpha)]
+
+    @staticmethod
+    def unique_indices(old_orients, alpha=DUPLICATE_ANGLE):
+        """Finding the orientations to keep of duplicate and similar ones, that are closer than the angle alpha.
+        The unit vectors are hashed into cubic cells with the size of the chord of alpha, so only the vectors of
+        neighbouring cells are compared. Of similar orientations the one of the highest weight (area or count) is
+        kept, of equal weights the first one, so the current orientation wins against the weightless supplements.
+        Args:
+            old_orients (list): list of orientation-tuples [[x, y, z], weight]
+            alpha (float): angle in degrees
+        Returns:
+            ascending indices of the unique orientations"""
+        if len(old_orients) < 2:
+            return np.arange(len(old_orients))
+        vectors = np.array([orientation[0] for orientation in old_orients], dtype=np.float64).reshape(-1, 3)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        chord = 2 * np.sin(np.radians(alpha) / 2)
+
+        # code of the cell of each vector, the offset keeps the neighbour cells of all vectors positive
+        offset = int(np.ceil(1 / chord)) + 2
+        size = 2 * offset + 1
+        cells = np.floor(vectors / chord).astype(np.int64) + offset
+        codes = (cells[:, 0] * size + cells[:, 1]) * size + cells[:, 2]
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+
+        # pairs of similar vectors (i, j) with i < j in the 27 neighbouring cells
+        first, second = list(), list()
+        for dx, dy, dz in np.stack(np.meshgrid([-1, 0, 1], [-1, 0, 1], [-1, 0, 1]), -1).reshape(-1, 3):
+            neighbour = codes + (dx * size + dy) * size + dz
+            start = np.searchsorted(sorted_codes, neighbour, side="left")
+            counts = np.searchsorted(sorted_codes, neighbour, side="right") - start
+            i = np.repeat(np.arange(len(codes)), counts)
+            j = order[np.arange(len(i)) - np.repeat(np.cumsum(counts) - counts - start, counts)]
+            similar = (i < j) & (np.sum(vectors[i] * vectors[j], axis=1) > np.cos(np.radians(alpha)))
+            first.append(i[similar])
+            second.append(j[similar])
+        first, second = np.concatenate(first + second), np.concatenate(second + first)  # both directions
+        pairs = np.argsort(first, kind="stable")
+        first, second = first[pairs], second[pairs]
+        bounds = np.searchsorted(first, np.arange(len(codes) + 1))
+
+        # keep the vectors by descending weight (the sort is stable) and remove their similar neighbours
+        weights = np.array([float(orientation[1]) for orientation in old_orients])
+        removed = np.zeros(len(codes), dtype=bool)
+        for i in np.argsort(-weights, kind="stable"):
+            if not removed[i]:
+                removed[second[bounds[i]:bounds[i + 1]]] = True
+        return np.flatnonzero(~removed)
+
+    def score_orientations(self, orientations, min_volume, progress=None):
+        """Calculating bottom, overhang, contour and unprintability for all orientations at once.
+        The vertices are projected onto a chunk of orientations with one matrix product per vertex, the chunk size
+        is chosen such that the scratch arrays stay within the memory budget.
         Args:
-            orientation (np.array): with format 3 x 3.
+            orientations (list): list of orientation-tuples [[x, y, z], weight]
+            min_volume (bool): minimize the support material volume or supported surfaces
+            progress (tuple): if given, the progress advances from the first to the second percentage with the chunks
         Returns:
-            adjusted mesh.
+            list of [orientation, bottom, overhang, contour, unprintability] in the order of the input
         """
-        self.mesh[:, 4, 0] = np.inner(self.mesh[:, 1, :], orientation)
-        self.mesh[:, 4, 1] = np.inner(self.mesh[:, 2, :], orientation)
-        self.mesh[:, 4, 2] = np.inner(self.mesh[:, 3, :], orientation)
-
-        self.mesh[:, 5, 1] = np.max(self.mesh[:, 4, :], axis=1)
-        self.mesh[:, 5, 2] = np.median(self.mesh[:, 4, :], axis=1)
-        sleep(0)  # Yield, so other threads get a bit of breathing space.
+        sides = -1 * np.array([side[0] for side in orientations], dtype=np.float64).reshape(-1, 3)
+        chunk_size = int(max(1, self.memory_budget // (max(len(self.mesh), 1) * BYTES_PER_FACE_ORIENTATION)))
+        if self.extended_mode:
+            self.mesh.edge_index()  # built before the scratch arrays of the chunks are allocated
+        results = list()
+        for start in range(0, len(sides), chunk_size):
+            chunk = sides[start:start + chunk_size]
+            sums = self.score_sums(self.mesh, chunk, min_volume)[1:]
+            results += self.collect_results(chunk, *sums, min_volume=min_volume)
+            if progress is not None:
+                self.update_progress(progress[0] + (progress[1] - progress[0]) * len(results) / len(sides))
+            sleep(0)  # Yield, so other threads get a bit of breathing space.
+            self.check_cancelled()
+        return results
 
-    def calc_overhang(self, orientation, min_volume):
-        """Calculating bottom and overhang area for a mesh regarding
-        the vector n.
+    def score_content(self, content, orientations, min_volume, filter_negligible=None):
+        """Calculating the results of few orientations for a mesh that is too large to be preprocessed at once.
+        The faces are preprocessed and scored in chunks, the first pass finds the lowest vertex of each orientation.
         Args:
-            orientation (np.array): with format 3 x 3.
+            content (np.array): undefined representation of the mesh, as for preprocess
+            orientations (list): list of orientation-tuples [[x, y, z], weight]
             min_volume (bool): minimize the support material volume or supported surfaces
+            filter_negligible (bool): remove faces smaller than NEGL_FACE_SIZE, decided by negligible_filter if None
         Returns:
-            the total bottom size, overhang size and contour length of the mesh
+            list of [orientation, bottom, overhang, contour, unprintability] in the order of the input
         """
-        total_min = np.amin(self.mesh[:, 4, :])
+        sides = -1 * np.array([side[0] for side in orientations], dtype=np.float64).reshape(-1, 3)
+        # preprocess needs about 200 bytes per face
+        face_chunk = int(max(1000, self.memory_budget // (len(sides) * BYTES_PER_FACE_ORIENTATION + 200)))
+        if filter_negligible is None:
+            filter_negligible = self.negligible_filter(content, face_chunk)
+
+        # the first pass finds the lowest vertex of the faces that are scored
+        total_min = np.full(len(sides), np.inf)
+        for mesh in self.mesh_chunks(content, face_chunk, filter_negligible=filter_negligible):
+            projections = [np.dot(sides.astype(mesh.dtype), vertex.T) for vertex in mesh.vertices]
+            projections = np.minimum(np.minimum(projections[0], projections[1]), projections[2])
+            total_min = np.minimum(total_min, np.amin(projections, axis=1, initial=np.inf))
+
+        sums = np.zeros((6, len(sides)))
+        # the bottom faces of all chunks are collected, as the boundary of the bottom area spans several chunks
+        bottom_faces = list()
+        for mesh in self.mesh_chunks(content, face_chunk, filter_negligible=filter_negligible):
+            sums += self.score_sums(mesh, sides, min_volume, total_min=total_min, bottom_faces=bottom_faces)[1:]
+            self.check_cancelled()
+        if bottom_faces:
+            sums[2] += Mesh.concatenate([mesh for mesh, _ in bottom_faces]).boundary_lengths(
+                np.concatenate([regions for _, regions in bottom_faces], axis=1))
+        if min_volume and self.support_estimator == "raster":
+            # the support is measured on the decimated mesh, that holds the parts below the overhangs of all chunks
+            sums[1] += self.raster_support(self.mesh, sides)[0]
+        return self.collect_results(sides, *sums, min_volume=min_volume)
 
-        # filter bottom area
-        bottom = np.sum(self.mesh[np.where(self.mesh[:, 5, 1] < total_min + self.FIRST_LAY_H), 5, 0])
-        # # equal than:
-        # bottoms = mesh[np.where(mesh[:, 5, 1] < total_min + FIRST_LAY_H)]
-        # if len(bottoms) > 0: bottom = np.sum(bottoms[:, 5, 0])
-        # else: bottom = 0
+    @staticmethod
+    def cluster_representatives(vertices, inverse, normals, offsets, weights, cell):
+        """Calculating the point with the least quadric error to the face planes of each vertex cluster.
+        Args:
+            vertices (np.array): vertices with format n x 3
+            inverse (np.array): cluster index of each vertex
+            normals, offsets, weights (np.array): unit normal, plane offset and area of the face of each vertex
+            cell (float): size of the grid cells
+        Returns:
+            representatives with format cluster_count x 3
+        """
+        counts = np.bincount(inverse)
+        means = np.stack([np.bincount(inverse, weights=vertices[:, i]) / counts for i in range(3)], axis=1)
+        quadric = np.zeros((len(counts), 3, 3))
+        for i in range(3):
+            for j in range(i, 3):
+                quadric[:, i, j] = quadric[:, j, i] = np.bincount(inverse, weights=weights * normals[:, i] * normals[:, j])
+        linear = np.stack([np.bincount(inverse, weights=weights * normals[:, i] * offsets) for i in range(3)], axis=1)
+
+        # a small regularization pulls the free directions (along flat regions and edges) towards the mean
+        regularization = 1e-3 * np.trace(quadric, axis1=1, axis2=2).reshape(-1, 1, 1) + 1e-12
+        representatives = np.linalg.solve(quadric + regularization * np.identity(3),
+                                          (regularization.reshape(-1, 1) * means - linear)[..., None])[..., 0]
+        # fall back to the mean if the representative leaves the neighbourhood of its cell
+        outside = np.linalg.norm(representatives - means, axis=1) > cell
+        representatives[outside] = means[outside]
+        return representatives
+
+    def refine(self, content, results, min_volume):
+        """Scoring the best orientations of a decimated mesh again on the full mesh. The relative difference
+        of the unprintability of the best orientation is stored in decimation_error.
+        Orientations whose bottom vanishes on the full mesh were only created by the decimation and are dropped,
+        if none is left the ranking of the decimated mesh is kept. Of similar orientations the best one is kept.
+        Args:
+            content (np.array): undefined representation of the full mesh, as for preprocess
+            results (list): results of the decimated mesh
+            min_volume (bool): minimize the support material volume or supported surfaces
+        Returns:
+            list of [orientation, bottom, overhang, contour, unprintability] of the refined orientations
+        """
+        results = sorted(results, key=lambda result: result[4])[:REFINE_COUNT]
+        refined = self.score_content(content, [[-result[0], 0] for result in results], min_volume,
+                                     filter_negligible=self.filter_negligible)
+        kept = [i for i, result in enumerate(refined) if result[1] > 0 or results[i][1] <= 0]
+        best = min(kept, key=lambda i: refined[i][4]) if kept else 0
+        self.decimation_error = abs(results[best][4] - refined[best][4]) / max(abs(refined[best][4]), 1e-12)
+        if not kept:
+            return results
+
+        refined = sorted([refined[i] for i in kept], key=lambda result: result[4])
+        return [refined[i] for i in self.unique_indices([[result[0], -result[4]] for result in refined])]
+
+    def local_search(self, results, budget, min_volume):
+        """Improving the best orientations by a pattern search on the unit sphere. The neighbours of all starts
+        are scored together in one call of score_orientations per iteration. The amount of scored orientations
+        is stored in local_evaluations.
+        Args:
+            results (list): results of the scored orientations
+            budget (int): maximal amount of orientations to score
+            min_volume (bool): minimize the support material volume or supported surfaces
+        Returns:
+            list of [orientation, bottom, overhang, contour, unprintability] of the improved orientations
+        """
+        current = sorted(results, key=lambda result: result[4])[:LOCAL_SEARCH_STARTS]
+        steps = np.full(len(current), LOCAL_SEARCH_STEP)
+        improved = set()
+        self.local_evaluations = 0
+        while True:
+            active = np.flatnonzero(steps >= LOCAL_SEARCH_MIN_STEP)
+            active = active[:(budget - self.local_evaluations) // LOCAL_SEARCH_DIRECTIONS]
+            if len(active) == 0:
+                break
+            neighbours = np.concatenate([self.tilt(np.asarray(current[i][0], dtype=np.float64), steps[i],
+                                                   LOCAL_SEARCH_DIRECTIONS) for i in active])
+            scored = self.score_orientations([[-side, 0] for side in neighbours], min_volume=min_volume)
+            self.local_evaluations += len(scored)
+            for n, i in enumerate(active):
+                candidates = scored[n * LOCAL_SEARCH_DIRECTIONS:(n + 1) * LOCAL_SEARCH_DIRECTIONS]
+                best = min(candidates, key=lambda result: result[4])
+                if best[4] < current[i][4]:
+                    current[i] = best
+                    improved.add(i)
+                else:
+                    steps[i] /= 2
+            sleep(0)  # Yield, so other threads get a bit of breathing space.
+            self.check_cancelled()
+        return [current[i] for i in sorted(improved)]
 
-        # filter overhangs
-        overhangs = self.mesh[np.where(np.inner(self.mesh[:, 0, :], orientation) < self.ASCENT)]
-        overhangs = overhangs[np.where(overhangs[:, 5, 1] > (total_min + self.FIRST_LAY_H))]
+    @staticmethod
+    def transform(points, transformation, dtype=np.float64):
+        """Applying a 4 x 4 transformation (or None) to points with format n x 3, without modifying the points."""
+        if transformation is None:
+            return np.array(points, dtype=dtype)
+        transformation = np.asarray(transformation, dtype=np.float64)
+        points = np.dot(np.asarray(points, dtype=dtype), transformation[:3, :3].T.astype(dtype))
+        points += transformation[:3, 3].astype(dtype)
+        return points
+
+    @classmethod
+    def triangles(cls, points, indices=None, transformation=None):
+        """Returns the (transformed) vertex list with 3 rows per face of an indexed mesh."""
+        points = cls.transform(points, transformation, np.result_type(np.asarray(points).dtype, np.float32))
+        return points if indices is None else points[np.asarray(indices).ravel()]
 
-        if self.extended_mode:
-            plafond = np.sum(overhangs[(overhangs[:, 0, :] == -orientation).all(axis=1), 5, 0])
-        else:
-            plafond = 0
+    @staticmethod
+    def count_faces(content):
+        """Returns the amount of faces of a vertex list (3 rows per face) or of a face_count x 4 x 3 array."""
+        return len(content) // 3 if np.ndim(content) == 2 else len(content)
 
-        if len(overhangs) > 0:
-            if min_volume:
-                heights = np.inner(overhangs[:, 1:4, :].mean(axis=1), orientation) - total_min
+    def negligible_filter(self, content, face_chunk=None):
+        """Deciding as preprocess does for the whole mesh, whether the faces smaller than NEGL_FACE_SIZE are removed:
+        only if more than 100 faces remain. The faces are preprocessed in chunks.
+        Args:
+            content (np.array): undefined representation of the mesh, as for preprocess
+            face_chunk (int): amount of faces per chunk, by default as many as fit into the memory budget
+        Returns:
+            True if the negligible faces are removed
+        """
+        if self.NEGL_FACE_SIZE <= 0:
+            return False
+        if face_chunk is None:
+            face_chunk = int(max(1000, self.memory_budget // 200))  # preprocess needs about 200 bytes per face
+        negl_size = self.NEGL_FACE_SIZE_EXTENDED if self.extended_mode else self.NEGL_FACE_SIZE
+        large_faces = 0
+        for mesh in self.mesh_chunks(content, face_chunk, filter_negligible=False):
+            large_faces += int(np.sum(mesh.areas > negl_size))
+            if large_faces > 100:
+                return True
+        return False
+
+    def mesh_chunks(self, content, face_chunk, filter_negligible):
+        """Yielding the preprocessed mesh of consecutive chunks of faces.
+        Args:
+            content (np.array): undefined representation of the mesh, as for preprocess
+            face_chunk (int): amount of faces per chunk
+            filter_negligible (bool): remove faces smaller than NEGL_FACE_SIZE
+        """
+        rows = 3 if np.ndim(content) == 2 else 1  # rows per face
+        for start in range(0, self.count_faces(content), face_chunk):
+            mesh = self.preprocess(content[start * rows:(start + face_chunk) * rows], filter_negligible)
+            if len(mesh) > 0:
+                yield mesh
+
+    def score_sums(self, mesh, sides, min_volume, total_min=None, bottom_faces=None):
+        """Summing bottom area, overhang, contour length and contour faces of a mesh for a chunk of orientations.
+        All sums but the contour length are additive over the faces, so a mesh can be scored in chunks if the
+        total_min is known and the bottom faces are collected. The lowest edges (see lowest_edges) are summed for
+        the orientations without contour faces.
+        Args:
+            mesh (Mesh): preprocessed mesh
+            sides (np.array): orientations with format n x 3
+            min_volume (bool): minimize the support material volume or supported surfaces
+            total_min (np.array): lowest projection of each orientation, calculated from the mesh if None
+            bottom_faces (list): if given, the contour length is not calculated, but the bottom faces and their
+                n x face_count mask are appended for Mesh.boundary_lengths
+        Returns:
+            total_min, bottom, overhang, contour length, amount of contour faces, lowest edge length and amount of
+            lowest edges, each with length n
+        """
+        sides = sides.astype(mesh.dtype)
+        normals = mesh.normals.T
+        areas = mesh.areas
+        # projections of each vertex with format n x face_count
+        p0, p1, p2 = [np.dot(sides, vertex.T) for vertex in mesh.vertices]
+        face_max = np.maximum(np.maximum(p0, p1), p2)
+        if total_min is None:
+            total_min = np.amin(np.minimum(np.minimum(p0, p1), p2), axis=1)
+        total_min = total_min.astype(mesh.dtype)
+        threshold = (total_min + self.FIRST_LAY_H)[:, None]
 
-                inner = np.inner(overhangs[:, 0, :], orientation) - self.ASCENT
-                # overhang = np.sum(heights * overhangs[:, 5, 0] * np.abs(inner * (inner < 0)) ** 2)
-                overhang = np.sum((self.height_offset + self.height_log * np.log(self.height_log_k * heights + 1)) *
-                                  overhangs[:, 5, 0] * np.abs(inner * (inner < 0)) ** self.OV_H)
-            else:
-                # overhang = np.sum(overhangs[:, 5, 0] * 2 *
-                #                   (np.amax((np.zeros(len(overhangs)) + 0.5,
-                #                             - np.inner(overhangs[:, 0, :], orientation)),
-                #                            axis=0) - 0.5) ** 2)
-                # improved performance by finding maximum using the multiplication method, see:
-                # https://stackoverflow.com/questions/32109319/how-to-implement-the-relu-function-in-numpy
-                inner = np.inner(overhangs[:, 0, :], orientation) - self.ASCENT
-                overhang = 2 * np.sum(overhangs[:, 5, 0] * np.abs(inner * (inner < 0)) ** 2)
-            overhang -= self.PLAFOND_ADV * plafond
+        # filter bottom area
+        bottom_area = face_max < threshold
+        bottom = np.dot(bottom_area, areas)
 
+        # filter overhangs
+        inner = np.dot(sides, normals)
+        overhangs = (inner < self.ASCENT) & (face_max > threshold)
+        depth = np.where(overhangs, self.ASCENT - inner, 0)
+        if min_volume and self.support_estimator == "raster":
+            # in chunks the support is added by score_content, as the part below an overhang may be in another chunk
+            overhang = np.zeros(len(sides)) if bottom_faces is not None else \
+                self.raster_support(mesh, sides, total_min, overhangs, depth)[0]
+        elif min_volume:
+            heights = np.where(overhangs, (p0 + p1 + p2) / 3 - total_min[:, None], 0)
+            overhang = np.dot((self.height_offset + self.height_log * np.log(self.height_log_k * heights + 1)) *
+                              depth ** self.OV_H, areas)
+            del heights
         else:
-            overhang = 0
-
-        # filter the total length of the bottom area's contour
+            overhang = 2 * np.dot(depth ** 2, areas)
+        del depth
         if self.extended_mode:
-            # contours = self.mesh[total_min+self.FIRST_LAY_H < self.mesh[:, 5, 1]]
-            contours = self.mesh[np.where(self.mesh[:, 5, 2] < total_min + self.FIRST_LAY_H)]
-
+            plafond = overhangs
+            for i in range(3):
+                plafond &= normals[i][None, :] == -sides[:, i, None]
+            overhang -= self.PLAFOND_ADV * np.dot(plafond, areas)
+        del inner, overhangs, p0, p1, p2, face_max
+
+        # filter the total length of the bottom area's contour, that are the edges between bottom and other faces
+        contour_length = np.zeros(len(sides))
+        contour_faces = np.zeros(len(sides))
+        edge_length = np.zeros(len(sides))
+        edge_faces = np.zeros(len(sides))
+        if self.extended_mode:
+            contour_faces = np.sum(bottom_area, axis=1)
+            if bottom_faces is None:
+                contour_length = mesh.boundary_lengths(bottom_area)
+            else:
+                faces = np.any(bottom_area, axis=0)
+                if np.any(faces):
+                    bottom_faces.append((mesh.take(faces), bottom_area[:, faces]))
+            resting = np.flatnonzero(contour_faces == 0)
+            if len(resting) > 0:
+                # in chunks the lowest vertex of the whole mesh is given
+                edge_length[resting], edge_faces[resting] = self.lowest_edges(
+                    mesh, sides[resting], None if bottom_faces is None else total_min[resting])
+        return total_min, bottom, overhang, contour_length, contour_faces, edge_length, edge_faces
+
+    def lowest_edges(self, mesh, sides, total_min=None):
+        """Estimating the contour of orientations without a face in the first layer, as the original Tweaker did for
+        all orientations: the part rests on an edge or a point, or the faces of its base were removed as negligible.
+        The edge between the two lowest vertices of each face whose two lowest vertices are in the first layer
+        is counted. The vertices are projected onto each orientation and sorted (stable) as in the original
+        Tweaker, so vertices of (nearly) the same height resolve to the same edge.
+        Args:
+            mesh (Mesh): preprocessed mesh
+            sides (np.array): orientations with format n x 3
+            total_min (np.array): lowest projection of each orientation, calculated from the mesh if None
+        Returns:
+            length and amount of the lowest edges, each with length n
+        """
+        lengths = np.zeros(len(sides))
+        counts = np.zeros(len(sides))
+        faces = np.arange(len(mesh))
+        for k, side in enumerate(sides):
+            projections = np.stack([np.inner(vertex, side) for vertex in mesh.vertices], axis=1)
+            lowest = np.amin(projections) if total_min is None else total_min[k]
+            contours = np.flatnonzero(np.median(projections, axis=1) < lowest + self.FIRST_LAY_H)
             if len(contours) > 0:
-                conlen = np.arange(len(contours))
-                sortsc0 = np.argsort(contours[:, 4, :], axis=1)[:, 0]
-                sortsc1 = np.argsort(contours[:, 4, :], axis=1)[:, 1]
-
-                con = np.array([np.subtract(
-                    contours[conlen, 1 + sortsc0, :],
-                    contours[conlen, 1 + sortsc1, :])])
-
-                contours = np.sum(np.power(con, 2), axis=-1) ** 0.5
-                contour = np.sum(contours) + self.CONTOUR_AMOUNT * len(contours)
+                order = np.argsort(projections[contours], axis=1, kind="stable")
+                edges = mesh.vertices[order[:, 0], faces[contours]] - mesh.vertices[order[:, 1], faces[contours]]
+                lengths[k] = np.sum(np.sum(np.power(edges, 2), axis=-1) ** 0.5)
+                counts[k] = len(contours)
+        return lengths, counts
+
+    def raster_support(self, mesh, sides, total_min=None, overhangs=None, depth=None):
+        """Estimating the support below the overhangs of a mesh for a chunk of orientations. The surface samples
+        of the mesh are sorted by grid cell and height, each overhanging sample is supported from the highest
+        upward facing sample below it in its cell, or from the plate.
+        Args:
+            mesh (Mesh): preprocessed mesh
+            sides (np.array): orientations with format n x 3
+            total_min (np.array): lowest projection of each orientation, calculated from the mesh if None
+            overhangs (np.array): n x face_count mask of the overhanging faces, calculated if None
+            depth (np.array): n x face_count depth of the overhangs below ASCENT, calculated if None
+        Returns:
+            overhang (the min_volume term of the target function with the support heights) and
+            support volume, each with length n
+        """
+        sides = np.asarray(sides, dtype=np.float64)
+        faces, points, weights = mesh.surface_samples()
+        normals = mesh.normals[faces].astype(np.float64)
+        if total_min is None:
+            total_min = np.amin(np.dot(sides, mesh.vertices.reshape(-1, 3).T.astype(np.float64)), axis=1)
+        overhang = np.zeros(len(sides))
+        volume = np.zeros(len(sides))
+        for k, side in enumerate(sides):
+            heights = np.dot(points, side) - total_min[k]
+            inner = np.dot(normals, side)
+            if overhangs is None:
+                needs_support = inner < self.ASCENT
+                needs_support &= heights > self.FIRST_LAY_H
+                sample_depth = np.where(needs_support, self.ASCENT - inner, 0)
             else:
-                contour = 0
+                needs_support = overhangs[k, faces]
+                sample_depth = depth[k, faces]
+            if not np.any(needs_support):
+                continue
+
+            # grid cell of each sample in the plane orthogonal to the side
+            u, w = self.tilt(side, np.pi / 2, 4)[:2]
+            x, y = np.dot(points, u), np.dot(points, w)
+            cell_size = max(np.ptp(x), np.ptp(y), 1e-9) / SUPPORT_GRID
+            columns = np.floor((y - y.min()) / cell_size).astype(np.int64)
+            cells = np.floor((x - x.min()) / cell_size).astype(np.int64) * (columns.max() + 1) + columns
+
+            # running maximum of the upward facing samples, shifted per cell so it doesn't leak into the next one
+            order = np.lexsort((heights, cells))
+            scale = heights.max() + 1
+            sorted_cells = cells[order]
+            shifted = sorted_cells * scale + np.where(inner[order] > 0, heights[order], -0.5)
+            below = np.maximum.accumulate(shifted) - sorted_cells * scale
+            below = np.maximum(below, 0)  # no upward facing sample below, supported from the plate
+
+            supported = order[needs_support[order]]
+            support_heights = np.maximum(heights[supported] - below[needs_support[order]], 0)
+            overhang[k] = np.sum(weights[supported] * (self.height_offset + self.height_log *
+                                 np.log(self.height_log_k * support_heights + 1)) * sample_depth[supported] ** self.OV_H)
+            volume[k] = np.sum(weights[supported] * np.abs(inner[supported]) * support_heights)
+        return overhang, volume
+
+    def footprint_areas(self, sides):
+        """Calculating the area of the smallest rectangle around the projection of the mesh onto the build plate,
+        for several orientations. The vertices are projected in chunks within the memory budget.
+        Args:
+            sides (np.array): orientations with format n x 3, the alignments of the results
+        Returns:
+            footprint area of each orientation
+        """
+        sides = np.asarray(sides, dtype=np.float64).reshape(-1, 3)
+        angles = np.arange(FOOTPRINT_ANGLES) * np.pi / FOOTPRINT_ANGLES
+        directions = list()
+        for side in sides:
+            u, w = self.tilt(side / np.linalg.norm(side), np.pi / 2, 4)[:2]
+            directions.append(np.cos(angles)[:, None] * u + np.sin(angles)[:, None] * w)
+        directions = np.concatenate(directions).T.astype(self.mesh.dtype)
+
+        points = self.mesh.vertices.reshape(-1, 3)
+        if len(points) > 8 * FOOTPRINT_CELLS ** 2:
+            points = farthest_vertices(points, FOOTPRINT_CELLS)
+        chunk = int(max(1, self.memory_budget // (directions.shape[1] * points.itemsize * 2)))
+        upper = np.full(directions.shape[1], -np.inf)
+        lower = np.full(directions.shape[1], np.inf)
+        for start in range(0, len(points), chunk):
+            projections = np.dot(points[start:start + chunk], directions)
+            upper = np.maximum(upper, projections.max(axis=0))
+            lower = np.minimum(lower, projections.min(axis=0))
+        widths = (upper - lower).reshape(len(sides), FOOTPRINT_ANGLES)
+        half = FOOTPRINT_ANGLES // 2
+        return np.amin(widths[:, :half] * widths[:, half:], axis=1)
+
+    def collect_results(self, sides, bottom, overhang, contour_length, contour_faces, edge_length, edge_faces,
+                        min_volume):
+        """Calculating the contour and unprintability from the sums of score_sums.
+        Returns:
+            list of [orientation, bottom, overhang, contour, unprintability]
+        """
+        if self.extended_mode:
+            # without a bottom area the boundary is empty, the lowest edges are taken instead, otherwise the contour
+            # would be 0 and such an orientation would get the best possible unprintability
+            resting = contour_faces == 0
+            contour_length = np.where(resting, edge_length, contour_length)
+            contour_faces = np.where(resting, edge_faces, contour_faces)
+            # CONTOUR_AMOUNT is added once per orientation with a contour, as the parameters were fitted that way
+            contour = contour_length + self.CONTOUR_AMOUNT * (contour_faces > 0)
         else:  # consider the bottom area as square, bottom=a**2 ^ contour=4*a
             contour = 4 * np.sqrt(bottom)
 
+        results = list()
+        for i, orientation in enumerate(sides):
+            unprintability = self.target_function(bottom[i], overhang[i], contour[i], min_volume=min_volume)
+            results.append([orientation, bottom[i], overhang[i], contour[i], unprintability])
+        return results
+
+    def decimate(self, content, max_faces, filter_negligible=False):
+        """Reducing the mesh to about max_faces faces by vertex clustering. The vertices are snapped to a grid
+        whose cells are about the size of an average decimated face, and each cell is replaced by the point with
+        the least quadric error to the planes of its faces. Flat regions such as the bottom stay flat and sharp
+        edges and corners are kept, so the area weighted normals and the contours are preserved.
+        Args:
+            content (np.array): undefined representation of the mesh, as for preprocess
+            max_faces (int): target amount of faces
+            filter_negligible (bool): remove faces smaller than NEGL_FACE_SIZE before the decimation, so the
+                decimated mesh holds the faces that are scored on the full mesh
+        Returns:
+            vertices of the decimated mesh with format 3*face_count x 3
+        """
+        faces = np.asarray(content, dtype=np.float64)
+        if faces.ndim == 3:  # the normals are prefixed (e.g. in STL format)
+            faces = faces[:, 1:4, :]
+        faces = faces.reshape(-1, 3, 3)
+        if filter_negligible:
+            negl_size = self.NEGL_FACE_SIZE_EXTENDED if self.extended_mode else self.NEGL_FACE_SIZE
+            areas = np.linalg.norm(np.cross(faces[:, 1] - faces[:, 0], faces[:, 2] - faces[:, 0]), axis=1) / 2
+            faces = faces[areas > negl_size]
+        if len(faces) <= max_faces:
+            return faces.reshape(-1, 3)
+
+        vertices = faces.reshape(-1, 3)
+        origin = np.amin(vertices, axis=0)
+        # area weighted plane equations of the faces, for the quadric error of the cluster representatives
+        normals = np.cross(faces[:, 1] - faces[:, 0], faces[:, 2] - faces[:, 0])
+        lengths = np.linalg.norm(normals, axis=1).reshape(-1, 1)
+        normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+        weights = np.repeat(lengths.reshape(-1) / 2, 3)
+        normals = np.repeat(normals, 3, axis=0)
+        offsets = -np.sum(normals * vertices, axis=1)
+        cell = np.sqrt(2 * np.sum(weights) / 3 / max_faces)  # a right triangle in a cell has half of its area
+        for _ in range(4):
+            _, inverse = self.group_keys(np.floor((vertices - origin) / cell).astype(np.int64))
+
+            # drop collapsed faces and faces that map onto the same clusters (with the same winding)
+            triangles = inverse.reshape(-1, 3)
+            triangles = triangles[(triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) &
+                                  (triangles[:, 2] != triangles[:, 0])]
+            shift = np.argmin(triangles, axis=1).reshape(-1, 1)
+            triangles = np.take_along_axis(triangles, (shift + np.arange(3)) % 3, axis=1)
+            first, _ = self.group_keys(triangles)
+            triangles = triangles[np.sort(first)]
+            if len(triangles) <= 1.2 * max_faces:
+                break
+            cell *= np.sqrt(len(triangles) / max_faces)
+
+        clusters = self.cluster_representatives(vertices, inverse, normals, offsets, weights, cell)
         sleep(0)  # Yield, so other threads get a bit of breathing space.
-        return bottom, overhang, contour
+        return clusters[triangles].reshape(-1, 3)
+
+    def record_stage(self, stage, duration, **values):
+        """Storing the duration and further values of a finished stage in self.stats
+        and passing them to the stats_callback.
+        Args:
+            stage (str): name of the stage
+            duration (float): wall time of the stage in seconds
+            values: face or orientation counts of the stage
+        """
+        self.stats[stage] = duration
+        self.stats.update(values)
+        if self.stats_callback:
+            self.stats_callback(stage, self.stats)
+
+    def check_cancelled(self):
+        """Raising TweakCancelled if the cancel_callback asks to stop."""
+        if self.cancel_callback is not None and self.cancel_callback():
+            raise TweakCancelled()
 
     def update_progress(self, new_progress):
+        self.check_cancelled()
         self._progress = new_progress
         if self.show_progress:
             os.system('cls')
@@ -522,3 +1567,23 @@ class Tweak:
         # rotational_matrix = np.around(rotational_matrix, decimals=6)
         sleep(0)  # Yield, so other threads get a bit of breathing space.
         return rotation_axis, phi, rotational_matrix
+
+
+class OrientationAnalyzer(Tweak):
+    """ Scoring of single orientations of a mesh, e.g. while the user adjusts the rotation by hand.
+
+    The mesh is preprocessed once and kept, without the search of the Tweak. Each call of score or
+    score_neighbourhood only projects the kept vertices onto the requested orientations.
+    """
+
+    def __init__(self, content, extended_mode=False, min_volume=False, parameter=None, indices=None,
+                 transformation=None, dtype=np.float64, memory_budget=MEMORY_BUDGET, support_estimator="centroid"):
+        self.load_parameter(parameter, min_volume)
+        self.support_estimator = support_estimator
+        self.cancel_callback = None
+        self.extended_mode = extended_mode
+        self.memory_budget = memory_budget
+        self.dtype = np.dtype(dtype)
+        self.mesh = self.preprocess(content, indices=indices, transformation=transformation)
+        if extended_mode:
+            self.mesh.edge_index()  # built once here, so scoring an orientation is fast
@@ -0,0 +1,121 @@
+#
+# Copyright (c) 2023 5@xes
+# AutoRotationTool is released under the terms of the AGPLv3 or higher.
+#
+# Persistent cache of the MeshTweaker results, keyed by a hash of the mesh and of the parameters.
+# This module must not import UM/Cura/PyQt, so it can be used outside of Cura as well.
+#
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+try:
+    from .MeshTweaker import PARAMETER, PARAMETER_VOL
+except ImportError:
+    from MeshTweaker import PARAMETER, PARAMETER_VOL
+
+# Increase when the format of the entries or the results of the Tweak change
+CACHE_FORMAT = 1
+# The rotation and scale of the transformation are rounded to these decimals
+TRANSFORMATION_DECIMALS = 6
+
+
+class OrientationCache:
+    """ Content addressed on-disk cache of orientation results with a least recently used eviction.
+
+    Each entry is a small JSON file named after its key. The key is a hash of the local vertex buffer, the rotation
+    and scale of the node, the keyword arguments of the Tweak, the parameter set and profile and the plugin version,
+    so changing any of these invalidates the entries.
+    """
+
+    def __init__(self, path, max_size=64 * 1024 * 1024, version=""):
+        self._path = path
+        self._max_size = max_size
+        self._version = version
+        self._entries = dict()  # key -> [size, last access], in memory index of the cache folder
+        os.makedirs(path, exist_ok=True)
+        for entry in os.scandir(path):
+            if entry.is_file() and entry.name.endswith(".json"):
+                stat = entry.stat()
+                self._entries[entry.name[:-5]] = [stat.st_size, stat.st_mtime]
+
+    def setMaxSize(self, max_size):
+        """Changing the size limit (in bytes) of the cache folder."""
+        self._max_size = max_size
+        self._evict()
+
+    def key(self, vertices, tweak_arguments, transformation=None, indices=None, parameter=None, profile=None):
+        """Calculating the key of a mesh and its Tweak arguments.
+        Args:
+            vertices (np.array): vertices of the mesh in its local coordinates
+            tweak_arguments (dict): keyword arguments of the Tweak
+            transformation (np.array): world transformation of the mesh, only its rotation and scale are used,
+                as a translation doesn't change the orientation
+            indices (np.array): face indices of an indexed mesh
+            parameter (dict): parameter set of the Tweak, the default set of the mode if None
+            profile (str): name and version of the parameter profile
+        Returns:
+            hex digest of the key
+        """
+        if parameter is None:
+            parameter = PARAMETER_VOL if tweak_arguments.get("min_volume") else PARAMETER
+        if transformation is None:
+            transformation = np.identity(4)
+        linear = np.round(np.asarray(transformation, dtype=np.float64)[:3, :3], decimals=TRANSFORMATION_DECIMALS)
+
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(np.ascontiguousarray(vertices).tobytes())
+        if indices is not None:
+            digest.update(np.ascontiguousarray(indices).tobytes())
+        digest.update(json.dumps([CACHE_FORMAT, self._version, (linear + 0.0).tolist(), sorted(tweak_arguments.items()),
+                                  sorted(parameter.items()), profile], default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Loading the results of a key.
+        Returns:
+            the results or None if the key is not cached
+        """
+        if key not in self._entries:
+            return None
+        file_name = os.path.join(self._path, key + ".json")
+        try:
+            with open(file_name, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            now = time.time()
+            os.utime(file_name, (now, now))  # the modification time keeps the order of the last access on disk
+        except (OSError, ValueError):
+            self._entries.pop(key, None)
+            return None
+        self._entries[key][1] = now
+        return result
+
+    def put(self, key, result):
+        """Storing the (JSON serializable) results of a key and evicting the least recently used entries."""
+        file_name = os.path.join(self._path, key + ".json")
+        data = json.dumps(result).encode("utf-8")
+        try:
+            with open(file_name, "wb") as f:
+                f.write(data)
+        except OSError:
+            return
+        self._entries[key] = [len(data), time.time()]
+        self._evict()
+
+    def _evict(self):
+        total_size = sum(size for size, _ in self._entries.values())
+        if total_size <= self._max_size:
+            return
+        for key, (size, _) in sorted(self._entries.items(), key=lambda entry: entry[1][1]):
+            try:
+                os.remove(os.path.join(self._path, key + ".json"))
+            except OSError:
+                pass
+            del self._entries[key]
+            total_size -= size
+            if total_size <= self._max_size:
+                return
@@ -0,0 +1,257 @@
+#
+# Copyright (c) 2023 5@xes
+# AutoRotationTool is released under the terms of the AGPLv3 or higher.
+#
+# A long-lived worker process that runs the MeshTweaker outside of Cura, so the numpy work doesn't compete with the
+# user interface for the GIL. The process is started on the first request and stays warm (numpy, the compiled
+# parameters and the icospheres are loaded once). The meshes are handed over as shared memory blocks, the requests
+# and the results are sent over a pipe. Without arguments the module runs a small client to try it without Cura:
+#   python OrientationService.py [--extended] [files.stl]
+# This module is imported by the worker process as a top level module and must not import UM/Cura/PyQt.
+#
+
+import argparse
+import multiprocessing
+import sys
+import threading
+import traceback
+from collections import deque
+from time import time
+
+try:
+    from .MeshTweaker import TweakCancelled
+    from .OrientationWorker import share, tweak_shared
+except ImportError:
+    from MeshTweaker import TweakCancelled
+    from OrientationWorker import share, tweak_shared
+
+# Seconds to wait for the worker process to stop before it is terminated
+STOP_TIMEOUT = 5
+# Seconds between the checks of the cancel callback while waiting for results
+POLL_INTERVAL = 0.1
+
+
+class ServiceError(Exception):
+    """Raised by the client if the worker process failed or died."""
+
+
+def serve(connection):
+    """Main loop of the worker process, executed until a "stop" request or the end of the pipe.
+    Requests are tuples: ("orient", request, descriptors, transformation, tweak_arguments), ("cancel", request)
+    and ("stop",). The answers are ("progress", request, progress), ("result", request, summary),
+    ("cancelled", request) and ("error", request, message).
+    Args:
+        connection (multiprocessing.connection.Connection): end of the pipe of the worker process
+    """
+    backlog = deque()  # requests received while a Tweak was running
+    cancelled = set()
+
+    def receive():
+        # read the waiting requests without blocking, the cancellations take effect at once
+        while connection.poll():
+            message = connection.recv()
+            if message[0] == "cancel":
+                cancelled.add(message[1])
+            else:
+                backlog.append(message)
+
+    while True:
+        try:
+            message = backlog.popleft() if backlog else connection.recv()
+        except EOFError:
+            return  # the client is gone
+        if message[0] == "stop":
+            return
+        if message[0] == "cancel":
+            cancelled.add(message[1])
+            continue
+        _, request, descriptors, transformation, tweak_arguments = message
+        receive()
+        if request in cancelled:
+            connection.send(("cancelled", request))
+            continue
+
+        def cancel_callback():
+            receive()
+            return request in cancelled
+
+        try:
+            summary = tweak_shared(descriptors, transformation, tweak_arguments,
+                                   lambda progress: connection.send(("progress", request, progress)), cancel_callback)
+            connection.send(("result", request, summary))
+        except TweakCancelled:
+            connection.send(("cancelled", request))
+        except Exception:
+            connection.send(("error", request, traceback.format_exc()))
+        cancelled.discard(request)
+
+
+class OrientationClient:
+    """ Client of the worker process, it is started on the first request and reused for all later requests.
+
+    The requests of one call of orient_all are queued in the worker process at once and the results are yielded as
+    they arrive. Calls from several threads are served one after another.
+    """
+
+    def __init__(self):
+        self._process = None
+        self._connection = None
+        self._lock = threading.Lock()
+        self._requests = 0
+
+    def is_running(self):
+        return self._process is not None and self._process.is_alive()
+
+    def start(self):
+        """Starting the worker process, if it is not running yet."""
+        if self.is_running():
+            return
+        self._close_connection()
+        context = multiprocessing.get_context("spawn")  # forking a threaded (Qt) process is not safe
+        self._connection, child = context.Pipe()
+        self._process = context.Process(target=serve, args=(child,), name="AutoRotationTool worker", daemon=True)
+        self._process.start()
+        child.close()
+
+    def stop(self):
+        """Stopping the worker process. If a request is running, the process is terminated after STOP_TIMEOUT."""
+        locked = self._lock.acquire(timeout=STOP_TIMEOUT)
+        try:
+            if self._process is None:
+                return
+            if locked:
+                try:
+                    self._connection.send(("stop",))
+                except (OSError, ValueError):
+                    pass
+                self._process.join(STOP_TIMEOUT)
+            if self._process.is_alive():
+                self._process.terminate()  # the waiting call gets a ServiceError
+            self._process = None
+            if locked:
+                self._close_connection()
+        finally:
+            if locked:
+                self._lock.release()
+
+    def _close_connection(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def orient_all(self, meshes, tweak_arguments, progress_callback=None, cancel_callback=None):
+        """Orienting several meshes in the worker process.
+        Args:
+            meshes (list): (vertices, indices, transformation) of each mesh, as for OrientationWorker.orient_all,
+                with an optional fourth item of keyword arguments of the Tweak of this mesh
+            tweak_arguments (dict): keyword arguments of the Tweak
+            progress_callback (function): called with (index, progress) of the meshes
+            cancel_callback (function): polled while waiting, if it returns True the requests are cancelled and
+                TweakCancelled is raised
+        Yields:
+            index and summarized results of each mesh, in the order they finish
+        Raises:
+            ServiceError: if a Tweak failed or the worker process died
+        """
+        with self._lock:
+            self.start()
+            shared = dict()  # shared memory blocks of each request, released with its answer
+            requests = dict()
+            try:
+                for index, mesh in enumerate(meshes):
+                    vertices, indices, transformation = mesh[:3]
+                    arguments = dict(tweak_arguments, **mesh[3]) if len(mesh) > 3 and mesh[3] else tweak_arguments
+                    self._requests += 1
+                    request = self._requests
+                    descriptors = []
+                    shared[request] = []
+                    for array in (vertices, indices):
+                        if array is None:
+                            descriptors.append(None)
+                            continue
+                        memory, descriptor = share(array)
+                        shared[request].append(memory)
+                        descriptors.append(descriptor)
+                    requests[request] = index
+                    self._connection.send(("orient", request, tuple(descriptors), transformation, arguments))
+
+                cancelling = False
+                while requests:
+                    if not cancelling and cancel_callback is not None and cancel_callback():
+                        # queued requests are dropped, the running one stops at its next check
+                        cancelling = True
+                        for request in requests:
+                            self._connection.send(("cancel", request))
+                    if not self._connection.poll(POLL_INTERVAL):
+                        if not self._process.is_alive():
+                            raise ServiceError("The worker process died with exit code {}".format(
+                                self._process.exitcode))
+                        continue
+                    answer = self._connection.recv()
+                    kind, request = answer[:2]
+                    if request not in requests:
+                        continue  # answer of a former, abandoned call
+                    if kind == "progress":
+                        if progress_callback:
+                            progress_callback(requests[request], answer[2])
+                        continue
+                    index = requests.pop(request)
+                    for memory in shared.pop(request):
+                        memory.close()
+                        memory.unlink()
+                    if kind == "error":
+                        raise ServiceError(answer[2])
+                    if kind == "result":
+                        yield index, answer[2]
+                if cancelling:
+                    raise TweakCancelled()
+            except (EOFError, OSError) as e:
+                raise ServiceError("The connection to the worker process failed: {}".format(e))
+            finally:
+                if requests and self.is_running():
+                    # abandoned by an error or the caller, the worker skips the remaining requests
+                    try:
+                        for request in requests:
+                            self._connection.send(("cancel", request))
+                    except (OSError, ValueError):
+                        pass
+                for memories in shared.values():
+                    for memory in memories:
+                        memory.close()
+                        memory.unlink()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Orienting STL files twice in the warm worker process, to compare "
+                                                 "the first request with the repeated one.")
+    parser.add_argument("inputs", nargs="*", help="STL files, a synthetic bracket if none are given")
+    parser.add_argument("--extended", action="store_true", help="search more orientations (slower)")
+    args = parser.parse_args(argv)
+
+    try:
+        from .MeshFile import load_stl
+        from .TweakerBenchmark import make_mesh
+    except ImportError:
+        from MeshFile import load_stl
+        from TweakerBenchmark import make_mesh
+    import numpy as np
+    if args.inputs:
+        meshes = [(load_stl(path), None, None) for path in args.inputs]
+    else:
+        meshes = [(make_mesh("bracket", 20000, np.random.default_rng(0)), None, None)]
+
+    client = OrientationClient()
+    try:
+        for run in ("first", "repeated"):
+            t_start = time()
+            for index, result in client.orient_all(meshes, {"extended_mode": args.extended}):
+                print("{} request, mesh {}: unprintability {:.4g}, {:.3f} s in the Tweak".format(
+                    run, index, result["unprintability"], result["stats"]["total"]))
+            print("{} request: {:.3f} s".format(run, time() - t_start))
+    finally:
+        client.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+#
+# Copyright (c) 2023 5@xes
+# AutoRotationTool is released under the terms of the AGPLv3 or higher.
+#
+# Process pool to run the MeshTweaker on several meshes in parallel.
+# The vertices and indices are handed over as shared memory buffers, so they are not pickled for every worker.
+# This module is imported by the worker processes as a top level module and must not import UM/Cura/PyQt.
+#
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+from queue import Empty
+
+import numpy as np
+
+try:
+    from .MeshTweaker import Tweak, TweakCancelled
+except ImportError:
+    from MeshTweaker import Tweak, TweakCancelled
+
+# Progress queue and cancel event of the worker process, set by the pool initializer
+_progress_queue = None
+_cancel_event = None
+
+
+def share(vertices):
+    """Copying the vertices into a new shared memory block.
+    Args:
+        vertices (np.array): vertices of a mesh
+    Returns:
+        the shared memory block (to be unlinked by the caller) and its descriptor for orient_shared
+    """
+    array = np.ascontiguousarray(vertices)
+    memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[...] = array
+    return memory, (memory.name, array.shape, array.dtype.str)
+
+
+def summarize(tweak):
+    """Extracting the results of a Tweak as plain (picklable and JSON serializable) python types.
+    Args:
+        tweak (Tweak): a finished tweaker
+    Returns:
+        dict with the euler parameters, rotation matrix, unprintability, the scores of the best_5 list, the
+        stats of the stages and, if footprints were measured, the candidates of the build plate orientation
+    """
+    [v, phi] = tweak.euler_parameter
+    result = {"euler_parameter": [[float(i) for i in v], float(phi)],
+              "matrix": np.asarray(tweak.matrix, dtype=np.float64).tolist(),
+              "alignment": [float(i) for i in tweak.alignment],
+              "unprintability": float(tweak.unprintability),
+              "best_5": [[[float(i) for i in align[0]]] + [float(i) for i in align[1:5]] for align in tweak.best_5],
+              "stats": dict(tweak.stats)}
+    if getattr(tweak, "footprints", None) is not None:
+        # the best orientations with their footprint, for the orientation of a whole build plate
+        result["candidates"] = [{"euler_parameter": [[float(i) for i in align[5][0]], float(align[5][1])],
+                                 "unprintability": float(align[4]), "footprint": float(footprint)}
+                                for align, footprint in zip(tweak.best_5, tweak.footprints)]
+    return result
+
+
+def _initialize(progress_queue, cancel_event):
+    global _progress_queue, _cancel_event
+    _progress_queue = progress_queue
+    _cancel_event = cancel_event
+
+
+def tweak_shared(descriptors, transformation, tweak_arguments, progress_callback=None, cancel_callback=None):
+    """Running the Tweak on a mesh in shared memory blocks.
+    Args:
+        descriptors (tuple): (name, shape, dtype) of the shared memory blocks of the vertices and of the
+            indices (None for a plain vertex list)
+        transformation (np.array): 4 x 4 transformation of the vertices or None
+        tweak_arguments (dict): keyword arguments of the Tweak
+        progress_callback (function): progress callback of the Tweak
+        cancel_callback (function): cancel callback of the Tweak
+    Returns:
+        the summarized results
+    """
+    memories = []
+    arrays = []
+    try:
+        for descriptor in descriptors:
+            if descriptor is None:
+                arrays.append(None)
+                continue
+            name, shape, dtype = descriptor
+            memories.append(shared_memory.SharedMemory(name=name))
+            arrays.append(np.ndarray(shape, dtype=dtype, buffer=memories[-1].buf))
+        vertices, indices = arrays
+        tweak = Tweak(vertices, verbose=False, progress_callback=progress_callback, cancel_callback=cancel_callback,
+                      indices=indices, transformation=transformation, **tweak_arguments)
+        del vertices, indices, arrays  # release the buffers, otherwise the shared memory can't be closed
+    finally:
+        for memory in memories:
+            memory.close()
+    return summarize(tweak)
+
+
+def orient_shared(index, descriptors, transformation, tweak_arguments):
+    """Running the Tweak on a mesh in shared memory blocks, executed in the worker process.
+    Args:
+        index (int): index of the mesh, used to report the progress
+        descriptors (tuple): shared memory blocks of the vertices and indices, see tweak_shared
+        transformation (np.array): 4 x 4 transformation of the vertices or None
+        tweak_arguments (dict): keyword arguments of the Tweak
+    Returns:
+        index and the summarized results
+    """
+    progress_callback = None
+    if _progress_queue is not None:
+        progress_callback = lambda progress: _progress_queue.put((index, progress))
+    cancel_callback = _cancel_event.is_set if _cancel_event is not None else None
+    return index, tweak_shared(descriptors, transformation, tweak_arguments, progress_callback, cancel_callback)
+
+
+def orient_all(meshes, processes, tweak_arguments, progress_callback=None, cancel_callback=None):
+    """Orienting several meshes in a pool of worker processes.
+    Args:
+        meshes (list): (vertices, indices, transformation) of each mesh, indices and transformation may be None,
+            a fourth item with keyword arguments of the Tweak of this mesh (e.g. its parameter) is optional
+        processes (int): amount of worker processes
+        tweak_arguments (dict): keyword arguments of the Tweak
+        progress_callback (function): called with (index, progress) of the meshes
+        cancel_callback (function): polled while waiting, if it returns True the workers are stopped and
+            TweakCancelled is raised
+    Yields:
+        index and summarized results of each mesh, in the order they finish
+    """
+    context = multiprocessing.get_context("spawn")  # forking a threaded (Qt) process is not safe
+    progress_queue = context.Queue()
+    cancel_event = context.Event()
+    shared = []
+    try:
+        tasks = []
+        for mesh in meshes:
+            vertices, indices, transformation = mesh[:3]
+            arguments = dict(tweak_arguments, **mesh[3]) if len(mesh) > 3 and mesh[3] else tweak_arguments
+            descriptors = []
+            for array in (vertices, indices):
+                if array is None:
+                    descriptors.append(None)
+                    continue
+                memory, descriptor = share(array)
+                shared.append(memory)
+                descriptors.append(descriptor)
+            tasks.append((descriptors, transformation, arguments))
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                                 initializer=_initialize, initargs=(progress_queue, cancel_event)) as executor:
+            pending = {executor.submit(orient_shared, index, descriptors, transformation, arguments)
+                       for index, (descriptors, transformation, arguments) in enumerate(tasks)}
+            while pending:
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                _drain(progress_queue, progress_callback)
+                for future in done:
+                    yield future.result()
+                if cancel_callback is not None and cancel_callback():
+                    # queued meshes are dropped, the running ones stop at their next check
+                    cancel_event.set()
+                    for future in pending:
+                        future.cancel()
+                    raise TweakCancelled()
+    finally:
+        for memory in shared:
+            memory.close()
+            memory.unlink()
+        progress_queue.close()
+
+
+def _drain(progress_queue, progress_callback):
+    while True:
+        try:
+            index, progress = progress_queue.get_nowait()
+        except Empty:
+            return
+        if progress_callback:
+            progress_callback(index, progress)
@@ -0,0 +1,95 @@
+#
+# Copyright (c) 2023 5@xes
+# AutoRotationTool is released under the terms of the AGPLv3 or higher.
+#
+# Named parameter profiles of the MeshTweaker, e.g. for materials with a different overhang tolerance.
+# A profile is a JSON file, its values replace those of the default parameter sets:
+#   {"format": 1, "name": "tpu", "version": 2, "description": "...",
+#    "parameter": {"ASCENT": -0.2}, "parameter_vol": {"ASCENT": -0.3}}
+# "parameter" changes the set of the area mode, "parameter_vol" the set of the min volume mode.
+# This module must not import UM/Cura/PyQt, so it can be used outside of Cura as well.
+#
+
+import glob
+import json
+import os
+
+try:
+    from .MeshTweaker import PARAMETER, PARAMETER_VOL, compile_parameter
+except ImportError:
+    from MeshTweaker import PARAMETER, PARAMETER_VOL, compile_parameter
+
+# Increase when the layout of the profile files changes
+PROFILE_FORMAT = 1
+DEFAULT_PROFILE = "default"
+
+
+class ParameterProfile:
+    """ A named and versioned pair of parameter sets, one for the area and one for the min volume mode.
+
+    The sets are validated and compiled when the profile is created, so an invalid file is reported at once and the
+    Tweaks find the derived constants in the cache of compile_parameter.
+    """
+
+    def __init__(self, name, parameter=None, parameter_vol=None, version=0, description="", path=None):
+        self.name = name
+        self.version = version
+        self.description = description
+        self.path = path
+        self._parameters = {False: dict(PARAMETER, **(parameter or {})),
+                            True: dict(PARAMETER_VOL, **(parameter_vol or {}))}
+        for values in self._parameters.values():
+            compile_parameter(values)  # validates the set and keeps its derived constants for the Tweaks
+
+    def parameter(self, min_volume=False):
+        """Returns the parameter set of the mode, for the parameter argument of the Tweak."""
+        return self._parameters[bool(min_volume)]
+
+    def key(self):
+        """Returns the name and version, which are stored with the results and are part of the cache key."""
+        return "{}@{}".format(self.name, self.version)
+
+    @classmethod
+    def load(cls, path):
+        """Loading a profile file.
+        Raises:
+            ValueError: if the file is not a valid profile
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError("Can't read the profile {}: {}".format(path, e))
+        if not isinstance(data, dict) or data.get("format") != PROFILE_FORMAT:
+            raise ValueError("{} is not a profile of format {}".format(path, PROFILE_FORMAT))
+        name = data.get("name") or os.path.splitext(os.path.basename(path))[0]
+        for mode in ("parameter", "parameter_vol"):
+            if not isinstance(data.get(mode, {}), dict):
+                raise ValueError("{}: {} must be an object".format(path, mode))
+        try:
+            return cls(str(name).lower(), data.get("parameter"), data.get("parameter_vol"),
+                       int(data.get("version", 0)), str(data.get("description", "")), path)
+        except (TypeError, ValueError) as e:
+            raise ValueError("{}: {}".format(path, e))
+
+
+def load_profiles(folders, errors=None):
+    """Loading the profile files (*.json) of several folders, a later folder overrides profiles of the same name.
+    Args:
+        folders (list): folders of the profile files, missing folders are skipped
+        errors (list): if given, the messages of the invalid files are appended, otherwise they raise ValueError
+    Returns:
+        dict of the profiles by their lower case name, always with the default profile
+    """
+    profiles = {DEFAULT_PROFILE: ParameterProfile(DEFAULT_PROFILE)}
+    for folder in folders:
+        for path in sorted(glob.glob(os.path.join(folder, "*.json"))):
+            try:
+                profile = ParameterProfile.load(path)
+            except ValueError as e:
+                if errors is None:
+                    raise
+                errors.append(str(e))
+                continue
+            profiles[profile.name] = profile
+    return profiles
@@ -0,0 +1,59 @@
+#
+# Copyright (c) 2023 5@xes
+# AutoRotationTool is released under the terms of the AGPLv3 or higher.
+#
+# Choice of the orientations of all models of a build plate, balancing the unprintability of each model against
+# the footprint of all models, so more parts fit onto one plate.
+# This module must not import UM/Cura/PyQt, so it can be used outside of Cura as well.
+#
+
+import numpy as np
+
+# Amount of the best orientations of each model that are considered
+PLATE_CANDIDATES = 5
+# Weight of the relative footprint against the relative unprintability of a model: with 0.5 an orientation that is
+# 10 % less printable is chosen if its footprint is at least 20 % smaller
+FOOTPRINT_WEIGHT = 0.5
+# Share of the build plate area that the footprints may cover, the rest is lost between the parts
+PLATE_FILL = 0.7
+
+
+def choose_orientations(candidates, capacity=None, footprint_weight=FOOTPRINT_WEIGHT):
+    """Choosing one orientation per model with a greedy heuristic.
+    First each model takes the orientation with the least cost, the unprintability and the footprint relative to
+    those of its best orientation. While the footprints exceed the capacity, the model whose change to a smaller
+    footprint costs the least per saved area is changed.
+    Args:
+        candidates (list): per model a list of (unprintability, footprint) of its orientations, best first
+        capacity (float): area available for the footprints, None for no limit
+        footprint_weight (float): weight of the relative footprint in the cost
+    Returns:
+        index of the chosen orientation of each model
+    """
+    if not candidates:
+        return []
+    count = max(len(model) for model in candidates)
+    unprintability = np.full((len(candidates), count), np.inf)
+    footprint = np.full((len(candidates), count), np.inf)
+    for i, model in enumerate(candidates):
+        unprintability[i, :len(model)] = [candidate[0] for candidate in model]
+        footprint[i, :len(model)] = [candidate[1] for candidate in model]
+    rows = np.arange(len(candidates))
+
+    # the unprintability may be 0 or negative for perfect models, so it is compared relative to a shifted scale
+    scale = np.maximum(np.abs(unprintability[:, :1]), 1e-3)
+    cost = (unprintability - unprintability[:, :1]) / scale + \
+        footprint_weight * footprint / np.maximum(footprint[:, :1], 1e-9)
+    cost[~np.isfinite(cost)] = np.inf
+    chosen = np.argmin(cost, axis=1)
+
+    if capacity is not None:
+        while np.sum(footprint[rows, chosen]) > capacity:
+            saved = footprint[rows, chosen][:, None] - footprint
+            extra = cost - cost[rows, chosen][:, None]
+            ratio = np.where(saved > 0, np.maximum(extra, 0) / np.where(saved > 0, saved, 1), np.inf)
+            model, orientation = np.unravel_index(np.argmin(ratio), ratio.shape)
+            if not np.isfinite(ratio[model, orientation]):
+                break  # no smaller footprints left, the models don't fit anyway
+            chosen[model] = orientation
+    return [int(i) for i in chosen]
@@ -0,0 +1,223 @@
+#
+# Copyright (c) 2023 5@xes
+# AutoRotationTool is released under the terms of the AGPLv3 or higher.
+#
+# Stable resting poses of a part: a part can only rest on the build plate on a plane of its 3D convex hull, and only
+# if its centre of mass projects inside the support polygon of this plane. The hull is built by a quickhull, the
+# facets of each plane are merged and the stability of all planes is checked at once with numpy.
+# This module must not import UM/Cura/PyQt, so it can be used outside of Cura as well.
+#
+
+import numpy as np
+
+# Above this amount of vertices the hull is built of the farthest vertex from the centre in each cell of a
+# latitude/longitude grid with HULL_CELLS rows, the removed vertices are hidden behind the kept ones
+HULL_POINTS = 4096
+HULL_CELLS = 32
+# Adjacent hull facets whose normals differ less than this angle (in degrees) form one resting plane
+PLANE_ANGLE = 0.5
+# Relative tolerance of the hull and of the inside test of the centre of mass, in units of the part size
+HULL_TOLERANCE = 1e-9
+STABILITY_TOLERANCE = 1e-6
+
+
+def farthest_vertices(points, cells):
+    """Reducing the vertices to the farthest vertex from their centre in each cell of a latitude/longitude grid,
+    of equally far vertices (e.g. on a cylinder) the first one is kept.
+    Args:
+        points (np.array): vertices with format n x 3
+        cells (int): rows of the grid, it has twice as many columns
+    Returns:
+        the kept vertices
+    """
+    offsets = points - np.mean(points, axis=0)
+    radius = np.sqrt(np.einsum("ij,ij->i", offsets, offsets))
+    rows = np.arccos(np.clip(offsets[:, 2] / np.maximum(radius, 1e-30), -1, 1)) * (cells / np.pi)
+    columns = (np.arctan2(offsets[:, 1], offsets[:, 0]) + np.pi) * (cells / np.pi)
+    index = np.minimum(rows.astype(np.int64), cells - 1) * 2 * cells + \
+        np.minimum(columns.astype(np.int64), 2 * cells - 1)
+    farthest = np.zeros(2 * cells ** 2, dtype=radius.dtype)
+    np.maximum.at(farthest, index, radius)
+    kept = np.flatnonzero(radius >= farthest[index])
+    return points[kept[np.unique(index[kept], return_index=True)[1]]]
+
+
+def _planes(points, faces):
+    """Returns the unit normals and offsets of the planes of the faces, degenerated faces get a zero normal."""
+    normals = np.cross(points[faces[:, 1]] - points[faces[:, 0]], points[faces[:, 2]] - points[faces[:, 0]])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.where(lengths > 0, normals / np.where(lengths > 0, lengths, 1), 0)
+    return normals, np.einsum("ij,ij->i", normals, points[faces[:, 0]])
+
+
+def convex_hull(points):
+    """Calculating the 3D convex hull with a quickhull.
+    In each step the farthest point outside of the hull is added: the facets it can see are replaced by a fan of
+    facets from their horizon to the point, and the outside points of the removed facets are assigned to the new ones.
+    Args:
+        points (np.array): points with format n x 3
+    Returns:
+        the points of the hull and its facets with format m x 3 (indices into these points, counter clockwise seen
+        from outside), no facets if the points are flat
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if len(points) <= 16 * HULL_POINTS:
+        points = np.unique(points, axis=0)  # the vertices of a mesh are repeated by each of their faces
+    if len(points) > HULL_POINTS:
+        points = np.unique(farthest_vertices(points, HULL_CELLS), axis=0)
+    none = np.zeros((0, 3), dtype=np.int64)
+    if len(points) < 4:
+        return points, none
+    eps = HULL_TOLERANCE * max(float(np.max(np.abs(points))), 1e-30)
+
+    # initial tetrahedron of extreme points
+    axis = np.argmax(np.ptp(points, axis=0))
+    a, b = np.argmin(points[:, axis]), np.argmax(points[:, axis])
+    line = points[b] - points[a]
+    c = np.argmax(np.linalg.norm(np.cross(points - points[a], line), axis=1))
+    normal = np.cross(line, points[c] - points[a])
+    heights = (points - points[a]) @ normal
+    d = np.argmax(np.abs(heights))
+    if np.abs(heights[d]) <= eps * np.linalg.norm(normal):
+        return points, none
+    if heights[d] > 0:
+        a, b = b, a  # the tetrahedron a, b, c, d with d below the face a, b, c
+    faces = np.array([[a, b, c], [a, d, b], [b, d, c], [c, d, a]], dtype=np.int64)
+    normals, offsets = _planes(points, faces)
+    alive = np.ones(4, dtype=bool)
+
+    # each outside point belongs to the facet it is farthest above
+    outside = np.setdiff1d(np.arange(len(points)), [a, b, c, d])
+    distances = points[outside] @ normals.T - offsets
+    owner = np.argmax(distances, axis=1)
+    height = distances[np.arange(len(outside)), owner]
+    keep = height > eps
+    outside, owner, height = outside[keep], owner[keep], height[keep]
+
+    while len(outside) > 0:
+        eye = outside[np.argmax(height)]
+        visible = alive & (normals @ points[eye] - offsets > eps)
+        visible[owner[np.argmax(height)]] = True
+        # the horizon are the edges of the visible facets whose opposite edge is on a hidden facet
+        edges = faces[visible][:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+        size = len(points)
+        codes = edges[:, 0] * size + edges[:, 1]
+        horizon = edges[~np.isin(edges[:, 1] * size + edges[:, 0], codes)]
+        new_faces = np.column_stack((horizon, np.full(len(horizon), eye)))
+        new_normals, new_offsets = _planes(points, new_faces)
+
+        first = len(faces)
+        alive[visible] = False
+        faces = np.concatenate((faces, new_faces))
+        normals = np.concatenate((normals, new_normals))
+        offsets = np.concatenate((offsets, new_offsets))
+        alive = np.concatenate((alive, np.ones(len(new_faces), dtype=bool)))
+
+        # the outside points of the removed facets are assigned to the new facets or are inside now
+        moved = visible[owner] & (outside != eye)
+        stay = ~visible[owner]
+        distances = points[outside[moved]] @ new_normals.T - new_offsets
+        new_owner = np.argmax(distances, axis=1)
+        new_height = distances[np.arange(len(new_owner)), new_owner]
+        keep = new_height > eps
+        outside = np.concatenate((outside[stay], outside[moved][keep]))
+        owner = np.concatenate((owner[stay], first + new_owner[keep]))
+        height = np.concatenate((height[stay], new_height[keep]))
+    return points, faces[alive]
+
+
+def hull_planes(points, faces, angle=PLANE_ANGLE):
+    """Merging the adjacent hull facets of (nearly) the same normal into planes.
+    The labels are propagated over the shared edges of similar facets, so a plane is one connected patch.
+    Args:
+        points (np.array): points of the hull
+        faces (np.array): facets of the hull with format m x 3
+        angle (float): maximal angle in degrees between the normals of merged facets
+    Returns:
+        plane index of each facet, the unit normals and the areas of the planes
+    """
+    vectors = np.cross(points[faces[:, 1]] - points[faces[:, 0]], points[faces[:, 2]] - points[faces[:, 0]])
+    areas = np.linalg.norm(vectors, axis=1) / 2
+    normals = vectors / np.maximum(2 * areas, 1e-30)[:, None]
+
+    # neighbours over the shared edges, the opposite edge of (i, j) is (j, i)
+    edges = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    size = len(points)
+    codes = edges[:, 0] * size + edges[:, 1]
+    order = np.argsort(codes)
+    opposite = np.searchsorted(codes[order], edges[:, 1] * size + edges[:, 0])
+    opposite = np.minimum(opposite, len(codes) - 1)
+    found = codes[order][opposite] == edges[:, 1] * size + edges[:, 0]
+    facet = np.repeat(np.arange(len(faces)), 3)[found]
+    neighbour = order[opposite[found]] // 3
+    similar = np.einsum("ij,ij->i", normals[facet], normals[neighbour]) >= np.cos(np.radians(angle))
+    facet, neighbour = facet[similar], neighbour[similar]
+
+    labels = np.arange(len(faces))
+    while True:
+        merged = labels.copy()
+        np.minimum.at(merged, facet, labels[neighbour])
+        if np.array_equal(merged, labels):
+            break
+        labels = merged[merged]  # jump to the label of the label, to converge in fewer rounds
+    _, plane = np.unique(labels, return_inverse=True)
+    plane = plane.reshape(-1)
+    plane_areas = np.bincount(plane, weights=areas)
+    sums = np.stack([np.bincount(plane, weights=vectors[:, k]) for k in range(3)], axis=1)
+    plane_normals = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-30)
+    return plane, plane_normals, plane_areas
+
+
+def center_of_mass(vertices):
+    """Calculating the centre of mass of a closed mesh of uniform density, from the signed volumes of the
+    tetrahedra between the faces and the mean vertex. For an open or flat mesh the centroid of its surface is used.
+    Args:
+        vertices (np.array): vertices v0, v1 and v2 of each face with format 3 x face_count x 3
+    Returns:
+        the centre of mass
+    """
+    origin = np.mean(vertices[0], axis=0, dtype=np.float64)
+    v0, v1, v2 = (np.asarray(vertices[i] - origin, dtype=np.float64).T for i in range(3))
+    # the triple products v0 . (v1 x v2) by components, np.cross is slow on long arrays
+    volumes = (v0[0] * (v1[1] * v2[2] - v1[2] * v2[1]) + v0[1] * (v1[2] * v2[0] - v1[0] * v2[2]) +
+               v0[2] * (v1[0] * v2[1] - v1[1] * v2[0])) / 6
+    volume = np.sum(volumes)
+    sums = v0 + v1 + v2
+    size = np.ptp(sums, axis=1) / 3
+    if abs(volume) > 1e-6 * max(float(np.prod(size)), 1e-30):
+        return origin + sums @ volumes / (4 * volume)
+    areas = np.linalg.norm(np.cross(v1 - v0, v2 - v0, axis=0), axis=0)
+    return origin + sums @ areas / (3 * max(float(np.sum(areas)), 1e-30))
+
+
+def stable_planes(points, faces, center, angle=PLANE_ANGLE):
+    """Finding the planes of the hull on which the part rests stably.
+    The centre of mass is projected onto the plane of each facet and tested against its triangle with barycentric
+    coordinates, a plane is stable if the projection falls into one of its (convex, so coplanar) facets.
+    Args:
+        points (np.array): points of the hull
+        faces (np.array): facets of the hull with format m x 3
+        center (np.array): centre of mass
+        angle (float): maximal angle in degrees between the normals of merged facets
+    Returns:
+        unit normals (outwards, so the orientation of the Tweak) and areas of the stable planes, largest first
+    """
+    if len(faces) == 0:
+        return np.zeros((0, 3)), np.zeros(0)
+    plane, normals, areas = hull_planes(points, faces, angle)
+    v0, v1, v2 = points[faces[:, 0]], points[faces[:, 1]], points[faces[:, 2]]
+    # projection along the normal of the plane onto the facet
+    direction = normals[plane]
+    projected = center - np.einsum("ij,ij->i", center - v0, direction)[:, None] * direction
+    e1, e2, p = v1 - v0, v2 - v0, projected - v0
+    d11, d12, d22 = np.einsum("ij,ij->i", e1, e1), np.einsum("ij,ij->i", e1, e2), np.einsum("ij,ij->i", e2, e2)
+    p1, p2 = np.einsum("ij,ij->i", p, e1), np.einsum("ij,ij->i", p, e2)
+    denominator = d11 * d22 - d12 * d12
+    safe = np.where(denominator > 0, denominator, 1)
+    u = (d22 * p1 - d12 * p2) / safe
+    w = (d11 * p2 - d12 * p1) / safe
+    tolerance = STABILITY_TOLERANCE
+    inside = (denominator > 0) & (u >= -tolerance) & (w >= -tolerance) & (u + w <= 1 + tolerance)
+    stable = np.bincount(plane[inside], minlength=len(areas)) > 0
+    order = np.flatnonzero(stable)[np.argsort(-areas[stable], kind="stable")]
+    return normals[order], areas[order]
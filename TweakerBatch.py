@@ -0,0 +1,147 @@
+#
+# Copyright (c) 2023 5@xes
+# AutoRotationTool is released under the terms of the AGPLv3 or higher.
+#
+# Command line batch orientation of STL files with the MeshTweaker, without Cura.
+# For each file either a sidecar JSON with the rotation matrix and the scores, or the rotated mesh is written.
+# This module must not import UM/Cura/PyQt, so it starts fast. Example:
+#   python TweakerBatch.py "parts/**/*.stl" --extended --processes 8 --output stl --output-dir oriented
+#
+
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import time
+
+import numpy as np
+
+try:
+    from .MeshTweaker import Tweak, CANDIDATE_GENERATORS, SUPPORT_ESTIMATORS
+    from .MeshFile import load_stl, save_stl, stl_chunks
+    from .OrientationWorker import summarize
+    from .ParameterProfiles import ParameterProfile
+except ImportError:
+    from MeshTweaker import Tweak, CANDIDATE_GENERATORS, SUPPORT_ESTIMATORS
+    from MeshFile import load_stl, save_stl, stl_chunks
+    from OrientationWorker import summarize
+    from ParameterProfiles import ParameterProfile
+
+OUTPUTS = ("json", "stl")
+
+
+def find_files(patterns):
+    """Expanding files, folders (searched recursively for STL files) and glob patterns.
+    Yields:
+        the STL files, each once
+    """
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths = sorted(glob.glob(os.path.join(pattern, "**", "*.[sS][tT][lL]"), recursive=True))
+        else:
+            paths = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        for path in paths:
+            if path not in seen:
+                seen.add(path)
+                yield path
+
+
+def output_path(path, output, output_dir=None):
+    """Returns the sidecar JSON or rotated STL file of an input file. The suffix of the rotated STL file keeps the
+    input from being overwritten, even if the output folder is the folder of the input."""
+    folder, file_name = os.path.split(path)
+    stem = os.path.splitext(file_name)[0]
+    file_name = stem + (".orientation.json" if output == "json" else "_oriented.stl")
+    return os.path.join(output_dir if output_dir is not None else folder, file_name)
+
+
+def orient_file(path, output, output_dir, tweak_arguments, stream=False):
+    """Orienting a single STL file and writing the result, executed in the worker processes.
+    Args:
+        path (str): STL file
+        output (str): one of OUTPUTS
+        output_dir (str): folder of the results, next to the input file if None
+        tweak_arguments (dict): keyword arguments of the Tweak
+        stream (bool): read the file in chunks, so the Tweak only holds the faces it keeps
+    Returns:
+        the input path, the written file, the face count and the unprintability
+    """
+    vertices = load_stl(path) if output == "stl" or not stream else None
+    tweak = Tweak(stl_chunks(path) if stream else vertices, verbose=False, **tweak_arguments)
+    target = output_path(path, output, output_dir)
+    if output == "json":
+        result = summarize(tweak)
+        result["file"] = os.path.basename(path)
+        with open(target, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=1)
+    else:
+        rotated = np.matmul(vertices, np.asarray(tweak.matrix, dtype=np.float64))
+        rotated[:, 2] -= rotated[:, 2].min()  # place it onto the build plate
+        save_stl(target, rotated, os.path.basename(path))
+    return path, target, tweak.stats["faces_input"], float(tweak.unprintability)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Auto orientation of STL files for FDM 3D printing.")
+    parser.add_argument("inputs", nargs="+", help="STL files, folders or glob patterns")
+    parser.add_argument("--extended", action="store_true", help="search more orientations (slower)")
+    parser.add_argument("--min-volume", action="store_true", help="minimize the support volume instead of the area")
+    parser.add_argument("--support-estimator", choices=SUPPORT_ESTIMATORS, default=SUPPORT_ESTIMATORS[0],
+                        help="estimation of the support in the min volume mode")
+    parser.add_argument("--profile", help="JSON file of a parameter profile, e.g. for a material")
+    parser.add_argument("--candidate-generator", choices=CANDIDATE_GENERATORS, default=CANDIDATE_GENERATORS[0])
+    parser.add_argument("--max-faces", type=int, help="search on a decimated mesh above this face count")
+    parser.add_argument("--stream", action="store_true",
+                        help="read the files in chunks and keep only the faces that are scored (not with --max-faces)")
+    parser.add_argument("--local-search", type=int, default=0,
+                        help="improve the best orientations with at most this many extra evaluations")
+    parser.add_argument("--output", choices=OUTPUTS, default="json",
+                        help="write a sidecar JSON with the rotation matrix or the rotated mesh")
+    parser.add_argument("--output-dir", help="folder of the results, next to the inputs by default")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    tweak_arguments = {"extended_mode": args.extended, "min_volume": args.min_volume,
+                       "support_estimator": args.support_estimator,
+                       "candidate_generator": args.candidate_generator, "max_faces": args.max_faces,
+                       "local_search": args.local_search}
+    if args.profile:
+        try:
+            profile = ParameterProfile.load(args.profile)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+        tweak_arguments["parameter"] = profile.parameter(args.min_volume)
+        print("Parameter profile {}".format(profile.key()))
+    if args.stream and args.max_faces:
+        print("--stream can't be combined with --max-faces", file=sys.stderr)
+        return 2
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    paths = list(find_files(args.inputs))
+    failed = 0
+    t_start = time()
+    with ProcessPoolExecutor(max_workers=max(1, args.processes)) as executor:
+        futures = {executor.submit(orient_file, path, args.output, args.output_dir, tweak_arguments,
+                                   args.stream): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                path, target, faces, unprintability = future.result()
+            except Exception as e:
+                failed += 1
+                print("{}: failed, {}".format(futures[future], e), file=sys.stderr)
+                continue
+            print("{}: {} faces, unprintability {:.4g} -> {}".format(path, faces, unprintability, target))
+    duration = time() - t_start
+
+    print("Oriented {} of {} files in {:.2f} s ({:.2f} files/s)".format(
+        len(paths) - failed, len(paths), duration, len(paths) / duration if duration > 0 else 0))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
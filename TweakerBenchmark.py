@@ -0,0 +1,525 @@
+#
+# Copyright (c) 2023 5@xes
+# AutoRotationTool is released under the terms of the AGPLv3 or higher.
+#
+# Reproducible benchmark of the MeshTweaker on a synthetic corpus of meshes.
+# It records the time of each stage, the peak memory and the chosen orientation of every mesh and mode,
+# writes them to JSON and compares them to a saved baseline to catch regressions in speed or results.
+# With --startup it also measures the imports and the register() that the plugin adds to the start of Cura, with
+# --decimation it checks the error of the search on a decimated mesh and with --resting the scores of parts resting
+# on an edge. This module must not import UM/Cura/PyQt (they are replaced by stubs to time register()), it runs with:
+#   python TweakerBenchmark.py --output results.json [--baseline baseline.json] [--startup] [--decimation] [--resting]
+#
+
+import argparse
+import ast
+import importlib.abc
+import importlib.util
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tracemalloc
+import types
+from time import time
+
+import numpy as np
+
+try:
+    from .MeshTweaker import OrientationAnalyzer, Tweak
+except ImportError:
+    from MeshTweaker import OrientationAnalyzer, Tweak
+
+SHAPES = ("cube", "cylinder", "bracket", "scan")
+SIZES = (1000, 100000, 1000000)
+MODES = {"fast": {"extended_mode": False, "min_volume": False},
+         "extended": {"extended_mode": True, "min_volume": False},
+         "min_volume": {"extended_mode": True, "min_volume": True}}
+# Seed of the random generators, the death star and the noise of the scans depend on it
+SEED = 3
+
+# Default tolerances of the comparison with a baseline
+TIME_TOLERANCE = 0.25  # relative slow down of the total time
+TIME_FLOOR = 0.05  # seconds, smaller slow downs are timer noise
+MEMORY_TOLERANCE = 0.25  # relative growth of the peak memory
+ANGLE_TOLERANCE = 1.0  # degrees between the chosen alignments
+UNPRINTABILITY_TOLERANCE = 1e-3  # relative change of the unprintability
+
+# The plugin module loaded by Cura at startup. Modules of the host are loaded by Cura anyway and are not counted,
+# the modules in LAZY_MODULES must only be imported on the first use of a menu item.
+PLUGIN_FOLDER = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_MODULE = "AutoRotationTool"
+HOST_MODULES = ("UM", "cura", "PyQt5", "PyQt6", "numpy", "typing", "collections", "os", "sys")
+LAZY_MODULES = ("HullAlignment", "MeshTweaker", "CalculateOrientationJob", "OrientationWorker", "OrientationCache",
+                "ParameterProfiles", "PlateOrientation", "StablePoses", "OrientationService", "MeshInstances",
+                "CheckPrintabilityJob")
+STARTUP_BUDGET = 0.05  # seconds the imports and the register() of the plugin may add to the start of Cura
+# Host modules replaced by stubs to time the register() of the plugin outside of Cura, and the name of the package
+HOST_STUBS = ("UM", "cura", "PyQt5", "PyQt6")
+PLUGIN_PACKAGE = "AutoRotationToolPlugin"
+
+# Meshes searched on a decimated mesh (the Tweak argument max_faces), the relative error of the unprintability of the
+# best orientation on the decimated and the full mesh must stay within the tolerance. The noise of the scans and the
+# support heights of min_volume are not kept by the decimation, so they are not checked.
+DECIMATION_SHAPES = ("cube", "cylinder", "bracket")
+DECIMATION_MODES = ("fast", "extended")
+DECIMATION_FACES = 20000
+DECIMATION_MAX_FACES = 2000
+DECIMATION_TOLERANCE = 0.1
+
+# Parts resting on an edge or a line in the extended mode: shape, faces, the alignment resting on the edge and the
+# alignment resting on a flat face. The edge needs a contour and must not score better than the flat face.
+RESTING_CASES = (("cylinder", 1000, (1, 0, 0), (0, 0, 1)), ("cube", 1000, (1, 0, 1), (0, 0, 1)),
+                 ("bracket", 1000, (0, 1, 1), (0, 0, 1)))
+
+
+def box(size, n, offset=(0, 0, 0)):
+    """Triangulated box with n x n quads on each side.
+    Args:
+        size (tuple): edge lengths in x, y and z
+        n (int): subdivisions of each side
+        offset (tuple): position of the lower corner
+    Returns:
+        vertices with format (12 * n * n * 3) x 3
+    """
+    u, v = np.meshgrid(np.arange(n), np.arange(n), indexing="ij")
+    u, v = u.ravel() / n, v.ravel() / n
+    d = 1 / n
+    # two triangles per quad in the unit square, counter clockwise seen from +z
+    square = np.stack([np.stack([u, v], -1), np.stack([u + d, v], -1), np.stack([u + d, v + d], -1),
+                       np.stack([u, v], -1), np.stack([u + d, v + d], -1), np.stack([u, v + d], -1)], axis=1)
+    sides = []
+    for axis in range(3):
+        a, b = (axis + 1) % 3, (axis + 2) % 3
+        for level in (0, 1):
+            side = np.zeros(square.shape[:2] + (3,))
+            side[..., a] = square[..., 0]
+            side[..., b] = square[..., 1]
+            side[..., axis] = level
+            if level == 0:  # flip the winding, so the normals point outwards
+                side = side[:, ::-1]
+            sides.append(side)
+    vertices = np.concatenate(sides).reshape(-1, 3)
+    return vertices * np.asarray(size, dtype=np.float64) + np.asarray(offset, dtype=np.float64)
+
+
+def cylinder(radius, height, segments, rings):
+    """Triangulated closed cylinder standing on the xy plane.
+    Returns:
+        vertices with format ((2 * rings + 2) * segments * 3) x 3
+    """
+    angles = np.linspace(0, 2 * np.pi, segments + 1)
+    c0, s0 = radius * np.cos(angles[:-1]), radius * np.sin(angles[:-1])
+    c1, s1 = radius * np.cos(angles[1:]), radius * np.sin(angles[1:])
+    z = np.linspace(0, height, rings + 1)
+    z0, z1 = z[:-1, None] * np.ones(segments), z[1:, None] * np.ones(segments)
+    c0, s0, c1, s1 = [np.broadcast_to(x, z0.shape) for x in (c0, s0, c1, s1)]
+    lower_0, lower_1 = np.stack([c0, s0, z0], -1), np.stack([c1, s1, z0], -1)
+    upper_0, upper_1 = np.stack([c0, s0, z1], -1), np.stack([c1, s1, z1], -1)
+    wall = np.stack([lower_0, lower_1, upper_1, lower_0, upper_1, upper_0], axis=2).reshape(-1, 3)
+    centre = np.zeros((segments, 3))
+    rim_0, rim_1 = lower_0[0], lower_1[0]
+    bottom = np.stack([centre, rim_1, rim_0], axis=1).reshape(-1, 3)
+    top = np.stack([centre + [0, 0, height], rim_0 + [0, 0, height], rim_1 + [0, 0, height]], axis=1).reshape(-1, 3)
+    return np.concatenate([wall, bottom, top])
+
+
+def scan(radius, faces, noise, rng):
+    """Noisy triangulated sphere, resembling a 3D scan.
+    Returns:
+        vertices with format (about faces * 3) x 3
+    """
+    rings = max(2, int(round(math.sqrt(faces / 4))))
+    segments = max(3, int(round(faces / (2 * rings))))
+    theta = np.linspace(0, np.pi, rings + 1)
+    phi = np.linspace(0, 2 * np.pi, segments + 1)
+    grid = np.stack([np.outer(np.sin(theta), np.cos(phi)), np.outer(np.sin(theta), np.sin(phi)),
+                     np.outer(np.cos(theta), np.ones_like(phi))], axis=-1)
+    grid *= radius * (1 + noise * rng.standard_normal(grid.shape[:2]))[..., None]
+    grid[:, -1] = grid[:, 0]  # close the seam
+    v00, v01, v10, v11 = grid[:-1, :-1], grid[:-1, 1:], grid[1:, :-1], grid[1:, 1:]
+    return np.stack([v00, v10, v11, v00, v11, v01], axis=2).reshape(-1, 3)
+
+
+def make_mesh(shape, faces, rng):
+    """Generating a synthetic mesh of about the given amount of faces.
+    Args:
+        shape (str): one of SHAPES
+        faces (int): approximate face count
+        rng (np.random.Generator): generator of the noise
+    Returns:
+        vertices with format (face_count * 3) x 3
+    """
+    if shape == "cube":
+        return box((20, 20, 20), max(1, int(round(math.sqrt(faces / 12)))))
+    if shape == "cylinder":
+        segments = max(8, int(round(math.sqrt(faces))))
+        return cylinder(10, 30, segments, max(1, int(round(faces / (2 * segments))) - 1))
+    if shape == "bracket":
+        # an L-shaped bracket with a cantilevered arm, which needs support unless it is rotated
+        n = max(1, int(round(math.sqrt(faces / 36))))
+        return np.concatenate([box((40, 5, 30), n), box((40, 20, 5), n, (0, 5, 25)), box((5, 20, 20), n, (35, 5, 5))])
+    if shape == "scan":
+        return scan(15, faces, 0.01, rng)
+    raise ValueError("Unknown shape: {}".format(shape))
+
+
+def run_case(vertices, mode, repeat=1):
+    """Running the Tweak on a mesh and measuring its stages.
+    Args:
+        vertices (np.array): mesh vertices
+        mode (str): one of MODES
+        repeat (int): the fastest of repeat runs is reported
+    Returns:
+        dict with the wall time and stats of the stages, the peak memory, the alignment and unprintability
+    """
+    best = None
+    for _ in range(repeat):
+        np.random.seed(SEED)
+        tracemalloc.start()
+        t_start = time()
+        tweak = Tweak(vertices, verbose=False, **MODES[mode])
+        wall = time() - t_start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if best is None or wall < best["wall_time"]:
+            best = {"wall_time": wall, "stages": dict(tweak.stats), "peak_memory": peak,
+                    "alignment": [float(i) for i in tweak.alignment],
+                    "unprintability": float(tweak.unprintability)}
+    return best
+
+
+def run(shapes=SHAPES, sizes=SIZES, modes=tuple(MODES), repeat=1, log=print):
+    """Running the whole benchmark.
+    Returns:
+        JSON serializable dict with the environment and the results, keyed by "shape/size/mode"
+    """
+    results = dict()
+    for shape in shapes:
+        for size in sizes:
+            vertices = make_mesh(shape, size, np.random.default_rng(SEED))
+            for mode in modes:
+                key = "{}/{}/{}".format(shape, size, mode)
+                result = run_case(vertices, mode, repeat)
+                result["faces"] = len(vertices) // 3
+                results[key] = result
+                log("{:32s} {:9d} faces {:8.3f} s {:8.1f} MB  unpr {:.4g}".format(
+                    key, result["faces"], result["wall_time"], result["peak_memory"] / 2 ** 20,
+                    result["unprintability"]))
+    return {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+            "seed": SEED, "results": results}
+
+
+def startup_imports(module=PLUGIN_MODULE, folder=PLUGIN_FOLDER, found=None):
+    """Collecting the modules imported when a plugin module is loaded, following the plugin's own modules.
+    Imports inside functions and in "if TYPE_CHECKING:" blocks are not executed at load time and are skipped.
+    Returns:
+        list of the imported plugin and external top level modules, without the host modules
+    """
+    found = [] if found is None else found
+    with open(os.path.join(folder, module + ".py"), "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    statements = list(tree.body)
+    while statements:
+        statement = statements.pop(0)
+        if isinstance(statement, ast.If) and "TYPE_CHECKING" in ast.dump(statement.test):
+            continue
+        if isinstance(statement, (ast.If, ast.Try)):
+            statements += statement.body + statement.orelse + getattr(statement, "finalbody", [])
+            statements += [line for handler in getattr(statement, "handlers", []) for line in handler.body]
+            continue
+        if isinstance(statement, ast.Import):
+            names = [alias.name for alias in statement.names]
+        elif isinstance(statement, ast.ImportFrom):
+            names = [statement.module or alias.name for alias in statement.names] if statement.level else \
+                [statement.module]
+        else:
+            continue
+        for name in names:
+            name = name.split(".")[0]
+            if name in found or name in HOST_MODULES:
+                continue
+            found.append(name)
+            if os.path.exists(os.path.join(folder, name + ".py")):
+                startup_imports(name, folder, found)
+    return found
+
+
+def import_times(modules, folder=PLUGIN_FOLDER):
+    """Measuring the import time of modules in a fresh interpreter, in which numpy is already loaded as in Cura.
+    Returns:
+        dict with the seconds of each module in the order of the imports, None for modules that can't be imported
+    """
+    script = ("import json, sys, time\nimport numpy\nsys.path.insert(0, {!r})\ntimes = dict()\n"
+              "for name in {!r}:\n"
+              "    t_start = time.perf_counter()\n"
+              "    try:\n"
+              "        __import__(name)\n"
+              "        times[name] = time.perf_counter() - t_start\n"
+              "    except Exception:\n"
+              "        times[name] = None\n"
+              "print(json.dumps(times))\n").format(folder, list(modules))
+    output = subprocess.run([sys.executable, "-c", script], stdout=subprocess.PIPE, check=True).stdout
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+class HostStubType(type):
+    """Metaclass of the stubs, so attributes of the classes are stubs as well, e.g. CuraApplication.getInstance."""
+
+    def __getattr__(cls, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return HostStub()
+
+
+class HostStub(metaclass=HostStubType):
+    """Stand-in for the classes and objects of Cura, Uranium and Qt when the plugin is loaded outside of Cura.
+    Every attribute and call returns another stub, so only the time of the plugin's own code is measured.
+    Called with a single function, e.g. as pyqtSlot() decorator, the function is returned."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return HostStub()
+
+    def __call__(self, *args, **kwargs):
+        if len(args) == 1 and not kwargs and isinstance(args[0], types.FunctionType):
+            return args[0]
+        return HostStub()
+
+
+class HostStubFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """Import hook that loads the HOST_STUBS modules and their submodules as modules of HostStub classes."""
+
+    def find_spec(self, name, path, target=None):
+        if name.split(".")[0] in HOST_STUBS:
+            return importlib.util.spec_from_loader(name, self, is_package=True)
+        return None
+
+    def create_module(self, spec):
+        module = types.ModuleType(spec.name)
+        classes = dict()
+
+        def stub_class(name):
+            if name.startswith("__"):
+                raise AttributeError(name)
+            if name not in classes:
+                classes[name] = HostStubType(name, (HostStub,), {})
+            return classes[name]
+        module.__getattr__ = stub_class
+        return module
+
+    def exec_module(self, module):
+        pass
+
+
+def time_register(folder=PLUGIN_FOLDER, package=PLUGIN_PACKAGE):
+    """Loading the plugin package and calling its register() as Cura does at startup, with stubs of the host modules.
+    Must run in a fresh interpreter, see measure_register.
+    Returns:
+        dict with the seconds of the import and of register(), and the lazy modules loaded by them
+    """
+    sys.meta_path.insert(0, HostStubFinder())
+    t_start = time()
+    spec = importlib.util.spec_from_file_location(package, os.path.join(folder, "__init__.py"),
+                                                  submodule_search_locations=[folder])
+    plugin = importlib.util.module_from_spec(spec)
+    sys.modules[package] = plugin
+    spec.loader.exec_module(plugin)
+    t_import = time()
+    plugin.register(HostStub())
+    t_register = time()
+    return {"import": t_import - t_start, "register": t_register - t_import,
+            "lazy_imported": [name for name in LAZY_MODULES if package + "." + name in sys.modules]}
+
+
+def measure_register(folder=PLUGIN_FOLDER):
+    """Timing the import and the register() of the plugin, including the constructor of the extension, in a fresh
+    interpreter in which numpy is already loaded as in Cura.
+    Returns:
+        dict of time_register, or None and the error if the plugin can't be registered
+    """
+    benchmark = os.path.splitext(os.path.basename(__file__))[0]
+    script = ("import json, sys\nimport numpy\nsys.path.insert(0, {!r})\nfrom {} import time_register\n"
+              "print(json.dumps(time_register({!r})))\n").format(os.path.dirname(os.path.abspath(__file__)),
+                                                                 benchmark, folder)
+    process = subprocess.run([sys.executable, "-c", script], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        return None, (process.stderr.decode().strip().splitlines() or ["unknown error"])[-1]
+    return json.loads(process.stdout.decode().strip().splitlines()[-1]), None
+
+
+def measure_startup(log=print):
+    """Measuring the imports of the plugin module that are not loaded by Cura itself, and the time of register().
+    Returns:
+        JSON serializable dict with the imported modules, their import times, the total time, the lazy modules
+        that are imported at startup by mistake and the result of measure_register
+    """
+    modules = startup_imports()
+    # the plugin modules that import UM can't be loaded outside of Cura, their own imports are measured instead
+    times = import_times([name for name in modules if not os.path.exists(os.path.join(PLUGIN_FOLDER, name + ".py"))]
+                         + [name for name in modules if os.path.exists(os.path.join(PLUGIN_FOLDER, name + ".py"))])
+    total = sum(value for value in times.values() if value is not None)
+    lazy = [name for name in modules if name in LAZY_MODULES]
+    log("Startup imports of {}: {} ({:.1f} ms)".format(PLUGIN_MODULE, ", ".join(modules) or "none", 1000 * total))
+    # for comparison, the modules that are only loaded on the first use
+    lazy_times = import_times(LAZY_MODULES)
+    log("Loaded on first use: " + ", ".join("{} ({})".format(name, "not importable here" if value is None else
+                                                             "{:.1f} ms".format(1000 * value))
+                                            for name, value in lazy_times.items()))
+    register, error = measure_register()
+    if register is None:
+        log("register() of the plugin failed with stubs of the host: " + error)
+    else:
+        log("register() of the plugin with stubs of the host: import {:.1f} ms, register {:.1f} ms".format(
+            1000 * register["import"], 1000 * register["register"]))
+    return {"modules": times, "time": total, "lazy_imported": lazy, "lazy_modules": lazy_times,
+            "register": register, "register_error": error}
+
+
+def compare(current, baseline, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE,
+            angle_tolerance=ANGLE_TOLERANCE, unprintability_tolerance=UNPRINTABILITY_TOLERANCE):
+    """Comparing benchmark results with a baseline.
+    Returns:
+        list of regression messages, empty if there are none
+    """
+    regressions = []
+    for key, new in sorted(current["results"].items()):
+        old = baseline["results"].get(key)
+        if old is None:
+            continue
+        if new["wall_time"] > old["wall_time"] * (1 + time_tolerance) + TIME_FLOOR:
+            regressions.append("{}: time {:.3f} s -> {:.3f} s".format(key, old["wall_time"], new["wall_time"]))
+        if new["peak_memory"] > old["peak_memory"] * (1 + memory_tolerance):
+            regressions.append("{}: peak memory {:.1f} MB -> {:.1f} MB".format(
+                key, old["peak_memory"] / 2 ** 20, new["peak_memory"] / 2 ** 20))
+        cosine = np.clip(np.dot(old["alignment"], new["alignment"]), -1, 1)
+        angle = math.degrees(math.acos(cosine))
+        if angle > angle_tolerance:
+            regressions.append("{}: alignment {} -> {} ({:.1f} deg)".format(
+                key, np.round(old["alignment"], 4).tolist(), np.round(new["alignment"], 4).tolist(), angle))
+        if abs(new["unprintability"] - old["unprintability"]) > \
+                unprintability_tolerance * max(abs(old["unprintability"]), 1e-6):
+            regressions.append("{}: unprintability {:.6g} -> {:.6g}".format(
+                key, old["unprintability"], new["unprintability"]))
+    return regressions
+
+
+def check_startup(startup, budget=STARTUP_BUDGET):
+    """Checking the startup imports and the register() of the plugin against the budget.
+    Returns:
+        list of regression messages, empty if there are none
+    """
+    register = startup["register"]
+    lazy = startup["lazy_imported"] + [name for name in (register or {}).get("lazy_imported", [])
+                                       if name not in startup["lazy_imported"]]
+    regressions = ["startup: {} is imported when the plugin is loaded".format(name) for name in lazy]
+    if startup["time"] > budget:
+        regressions.append("startup: imports take {:.1f} ms, the budget is {:.1f} ms".format(
+            1000 * startup["time"], 1000 * budget))
+    if register is None:
+        regressions.append("startup: register() fails: " + startup["register_error"])
+    elif register["import"] + register["register"] > budget:
+        regressions.append("startup: import and register() take {:.1f} ms, the budget is {:.1f} ms".format(
+            1000 * (register["import"] + register["register"]), 1000 * budget))
+    return regressions
+
+
+def check_decimation(shapes=DECIMATION_SHAPES, modes=DECIMATION_MODES, faces=DECIMATION_FACES,
+                     max_faces=DECIMATION_MAX_FACES, tolerance=DECIMATION_TOLERANCE, log=print):
+    """Checking the decimation_error of the Tweak on meshes that are searched on a decimated mesh.
+    Returns:
+        list of regression messages, empty if there are none
+    """
+    regressions = []
+    for shape in shapes:
+        vertices = make_mesh(shape, faces, np.random.default_rng(SEED))
+        for mode in modes:
+            key = "{}/{}/{}".format(shape, faces, mode)
+            np.random.seed(SEED)
+            tweak = Tweak(vertices, verbose=False, max_faces=max_faces, **MODES[mode])
+            log("{:32s} decimated to {} faces, error {:.4g}  unpr {:.4g}".format(
+                key, max_faces, tweak.decimation_error, tweak.unprintability))
+            if tweak.decimation_error > tolerance:
+                regressions.append("{}: decimation error {:.4g}, the tolerance is {:.4g}".format(
+                    key, tweak.decimation_error, tolerance))
+    return regressions
+
+
+def check_resting(cases=RESTING_CASES, log=print):
+    """Checking the extended mode scores of parts resting on an edge against a flat face of the same part.
+    Returns:
+        list of regression messages, empty if there are none
+    """
+    regressions = []
+    for shape, faces, edge, flat in cases:
+        key = "{}/{}/extended".format(shape, faces)
+        analyzer = OrientationAnalyzer(make_mesh(shape, faces, np.random.default_rng(SEED)), extended_mode=True)
+        on_edge, on_face = analyzer.score(edge), analyzer.score(flat)
+        log("{:32s} on the edge {}: contour {:.4g} unpr {:.4g}, on the face {}: unpr {:.4g}".format(
+            key, list(edge), on_edge[3], on_edge[4], list(flat), on_face[4]))
+        if on_edge[3] <= 0:
+            regressions.append("{}: no contour resting on the edge {}".format(key, list(edge)))
+        if on_edge[4] < on_face[4]:
+            regressions.append("{}: resting on the edge {} scores {:.4g}, better than on the face {} ({:.4g})".format(
+                key, list(edge), on_edge[4], list(flat), on_face[4]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the MeshTweaker on synthetic meshes.")
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES), help="approximate face counts")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--repeat", type=int, default=1, help="report the fastest of several runs")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results with this JSON file")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE)
+    parser.add_argument("--angle-tolerance", type=float, default=ANGLE_TOLERANCE)
+    parser.add_argument("--startup", action="store_true",
+                        help="only measure the imports of the plugin at the start of Cura and check the budget")
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET, help="seconds")
+    parser.add_argument("--decimation", action="store_true",
+                        help="only check the error of the search on decimated meshes against the tolerance")
+    parser.add_argument("--decimation-tolerance", type=float, default=DECIMATION_TOLERANCE)
+    parser.add_argument("--resting", action="store_true",
+                        help="only check that parts resting on an edge don't score better than on a flat face")
+    args = parser.parse_args(argv)
+
+    if args.startup or args.decimation or args.resting:
+        regressions = []
+        if args.startup:
+            regressions += check_startup(measure_startup(), args.startup_budget)
+        if args.decimation:
+            regressions += check_decimation(tolerance=args.decimation_tolerance)
+        if args.resting:
+            regressions += check_resting()
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        return 1 if regressions else 0
+
+    current = run(args.shapes, args.sizes, args.modes, args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.time_tolerance, args.memory_tolerance, args.angle_tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            return 1
+        print("No regressions against {}".format(args.baseline))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())